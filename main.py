@@ -1,9 +1,14 @@
 import json
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 from typing import Dict, Any, List, Optional, Tuple
 
 import os
 import re
+from html.parser import HTMLParser
 from dotenv import load_dotenv
 
 from langchain_core.prompts import ChatPromptTemplate
@@ -11,17 +16,58 @@ from langchain_groq import ChatGroq
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import BaseMessage
 
+try:
+    import orjson
+except ImportError:  # optional: faster serialization when installed
+    orjson = None
+
 load_dotenv()
 
+log = logging.getLogger("simgen")
+
 
 # ------------ Utility ------------
 
+def configure_logging(level: str = "INFO") -> QueueListener:
+    """
+    Send log records through a queue; a background listener thread does the
+    actual stdout writes. Returns the started listener (call .stop() on exit).
+    """
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    listener = QueueListener(log_queue, console)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(QueueHandler(log_queue))
+    listener.start()
+    return listener
+
+
 def load_spec(path: str) -> Dict[str, Any]:
     """Load spec JSON - expects single concept format"""
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
+def _atomic_write(path: Path, data: str) -> None:
+    """Write text as UTF-8 via a temp file + os.replace (no partial files on crash)."""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(data.encode("utf-8"))
+    os.replace(tmp, path)
+
+
+def dump_prompt_json(data: Any) -> str:
+    """
+    Serialize a dict once for prompt injection (indented, non-ASCII kept).
+    The returned string is reused for every chain that needs it.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+
 def safe_json_parse(raw: Any) -> Dict[str, Any]:
     """Try to parse a JSON object from an LLM response."""
     if isinstance(raw, BaseMessage):
@@ -95,6 +141,105 @@ def check_minimum_requirements(html: str) -> List[str]:
     return issues
 
 
+_VOID_TAGS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+})
+
+# Tags whose end tag browsers infer, so a missing close is not a bug
+_OPTIONAL_END_TAGS = frozenset({
+    "html", "head", "body", "p", "li", "dt", "dd", "option", "optgroup",
+    "tr", "td", "th", "thead", "tbody", "tfoot", "colgroup",
+})
+
+
+class _TagBalanceChecker(HTMLParser):
+    """Collect unbalanced tags and inline <script> bodies in a single parse."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack: List[str] = []
+        self.errors: List[str] = []
+        self.scripts: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _VOID_TAGS:
+            return
+        self.stack.append(tag)
+        if tag == "script":
+            self.scripts.append("")
+
+    def handle_endtag(self, tag):
+        if tag in _VOID_TAGS:
+            return
+        if tag not in self.stack:
+            self.errors.append(f"Stray </{tag}>")
+            return
+        while self.stack:
+            open_tag = self.stack.pop()
+            if open_tag == tag:
+                break
+            if open_tag not in _OPTIONAL_END_TAGS:
+                self.errors.append(f"<{open_tag}> not closed before </{tag}>")
+
+    def handle_data(self, data):
+        if self.stack and self.stack[-1] == "script":
+            self.scripts[-1] += data
+
+    def close(self):
+        super().close()
+        for open_tag in self.stack:
+            if open_tag not in _OPTIONAL_END_TAGS:
+                self.errors.append(f"<{open_tag}> never closed")
+
+
+def _js_brackets_balanced(code: str) -> bool:
+    """Cheap JS sanity check: brackets balance outside strings and comments."""
+    pairs = {")": "(", "]": "[", "}": "{"}
+    stack = []
+    i, n = 0, len(code)
+    while i < n:
+        ch = code[i]
+        if ch in "\"'`":
+            i += 1
+            while i < n and code[i] != ch:
+                i += 2 if code[i] == "\\" else 1
+        elif code.startswith("//", i):
+            newline = code.find("\n", i)
+            i = n if newline == -1 else newline
+        elif code.startswith("/*", i):
+            end = code.find("*/", i + 2)
+            i = n if end == -1 else end + 1
+        elif ch in "([{":
+            stack.append(ch)
+        elif ch in pairs:
+            if not stack or stack.pop() != pairs[ch]:
+                return False
+        i += 1
+    return not stack
+
+
+def local_bugfix(html: str) -> Tuple[bool, str]:
+    """
+    Heuristic-only bug check run before the Bugfix Agent.
+    Returns (has_bug, html); when has_bug is False the LLM call can be skipped.
+    """
+    checker = _TagBalanceChecker()
+    try:
+        checker.feed(html)
+        checker.close()
+    except Exception:
+        return True, html
+
+    if checker.errors:
+        return True, html
+    if not all(_js_brackets_balanced(script) for script in checker.scripts):
+        return True, html
+    if check_minimum_requirements(html):
+        return True, html
+    return False, html
+
+
 # ------------ Step 1: PLANNER NODE ------------
 
 def build_planner_chain():
@@ -852,23 +997,23 @@ def generate_simulation_with_checks(
 ) -> Tuple[bool, str]:
     """Generate CBSE Class 7 single-file simulation."""
     
-    print("=" * 70)
-    print("CBSE CLASS 7 SIMULATION GENERATOR (Single-File HTML)")
-    print("=" * 70)
+    log.info("=" * 70)
+    log.info("CBSE CLASS 7 SIMULATION GENERATOR (Single-File HTML)")
+    log.info("=" * 70)
     
     # 1. Load spec
-    print("\n[1/6] Loading concept...")
+    log.info("\n[1/6] Loading concept...")
     try:
         spec = load_spec(spec_path)
-        spec_json = json.dumps(spec, indent=2, ensure_ascii=False)
+        spec_json = dump_prompt_json(spec)
         concept_name = spec.get('Concept', 'Unknown Concept')
-        print(f"✓ Concept: {concept_name}")
+        log.info("✓ Concept: %s", concept_name)
     except Exception as e:
-        print(f"✗ Failed to load: {e}")
+        log.error("✗ Failed to load: %s", e)
         return False, ""
 
     # 2. Build chains
-    print("\n[2/6] Initializing agents...")
+    log.info("\n[2/6] Initializing agents...")
     try:
         planner_chain = build_planner_chain()
         creation_chain = build_creation_chain()
@@ -876,30 +1021,30 @@ def generate_simulation_with_checks(
         student_interaction_chain = build_student_interaction_chain()
         incorporate_feedback_chain = build_incorporate_feedback_chain()
         review_chain = build_review_chain()
-        print("✓ All agents initialized")
+        log.info("✓ All agents initialized")
     except Exception as e:
-        print(f"✗ Init failed: {e}")
+        log.error("✗ Init failed: %s", e)
         return False, ""
 
     # 3. PLANNER NODE
-    print("\n[3/6] Planning simulation (Planner Agent)...")
+    log.info("\n[3/6] Planning simulation (Planner Agent)...")
     try:
         plan_response = planner_chain.invoke({"spec_json": spec_json})
         plan_data = safe_json_parse(plan_response.content)
-        plan_json = json.dumps(plan_data, indent=2, ensure_ascii=False)
+        plan_json = dump_prompt_json(plan_data)
         
         if save_intermediates:
-            Path("1_planner_blueprint.json").write_text(plan_json, encoding="utf-8")
+            _atomic_write(Path("1_planner_blueprint.json"), plan_json)
         
-        print("✓ Blueprint created")
-        print(f"   Objectives: {len(plan_data.get('learning_objectives', []))}")
-        print(f"   Variables: {len(plan_data.get('variables_to_simulate', []))}")
+        log.info("✓ Blueprint created")
+        log.info("   Objectives: %s", len(plan_data.get('learning_objectives', [])))
+        log.info("   Variables: %s", len(plan_data.get('variables_to_simulate', [])))
     except Exception as e:
-        print(f"✗ Planning failed: {e}")
+        log.error("✗ Planning failed: %s", e)
         return False, ""
 
     # 4. CREATOR NODE
-    print("\n[4/6] Creating index.html (Creator Agent)...")
+    log.info("\n[4/6] Creating index.html (Creator Agent)...")
     try:
         creation_response = creation_chain.invoke({
             "spec_json": spec_json, 
@@ -909,43 +1054,47 @@ def generate_simulation_with_checks(
         html = creation_data.get("index.html", "")
 
         if save_intermediates:
-            Path("2_creator_output.html").write_text(html, encoding="utf-8")
+            _atomic_write(Path("2_creator_output.html"), html)
 
         issues = check_minimum_requirements(html)
         if issues:
-            print("⚠ Initial issues:")
+            log.warning("⚠ Initial issues:")
             for issue in issues:
-                print(f"   - {issue}")
+                log.warning("   - %s", issue)
         else:
-            print("✓ Basic validation passed")
+            log.info("✓ Basic validation passed")
             
     except Exception as e:
-        print(f"✗ Creation failed: {e}")
+        log.error("✗ Creation failed: %s", e)
         return False, ""
 
     # 5. BUGFIX NODE
-    print("\n[5/6] Fixing issues (Bugfix Agent)...")
+    log.info("\n[5/6] Fixing issues (Bugfix Agent)...")
     try:
-        bugfix_response = bugfix_chain.invoke({"html": html})
-        bugfix_data = safe_json_parse(bugfix_response.content)
-        html = bugfix_data.get("index.html", html)
-        
-        if bugfix_data.get("fixed", False):
-            explanations = bugfix_data.get("explanations", [])
-            print(f"✓ Fixed {len(explanations)} issues:")
-            for exp in explanations[:3]:  # Show first 3
-                print(f"   - {exp}")
+        has_bug, html = local_bugfix(html)
+        if not has_bug:
+            log.info("✓ Local checks passed, skipping Bugfix Agent")
         else:
-            print("✓ No critical bugs found")
+            bugfix_response = bugfix_chain.invoke({"html": html})
+            bugfix_data = safe_json_parse(bugfix_response.content)
+            html = bugfix_data.get("index.html", html)
+
+            if bugfix_data.get("fixed", False):
+                explanations = bugfix_data.get("explanations", [])
+                log.info("✓ Fixed %s issues:", len(explanations))
+                for exp in explanations[:3]:  # Show first 3
+                    log.info("   - %s", exp)
+            else:
+                log.info("✓ No critical bugs found")
             
         if save_intermediates:
-            Path("3_bugfix_output.html").write_text(html, encoding="utf-8")
+            _atomic_write(Path("3_bugfix_output.html"), html)
             
     except Exception as e:
-        print(f"⚠ Bugfix error: {e}")
+        log.warning("⚠ Bugfix error: %s", e)
 
     # 6. STUDENT INTERACTION NODE  
-    print("\n[6/6] Generating student questions (Student Interaction Agent)...")
+    log.info("\n[6/6] Generating student questions (Student Interaction Agent)...")
     try:
         interaction_response = student_interaction_chain.invoke({
             "spec_json": spec_json,
@@ -954,22 +1103,22 @@ def generate_simulation_with_checks(
         interaction_data = safe_json_parse(interaction_response.content)
         
         if save_intermediates:
-            Path("4_student_interaction.json").write_text(
-                json.dumps(interaction_data, indent=2), 
-                encoding="utf-8"
+            _atomic_write(
+                Path("4_student_interaction.json"),
+                json.dumps(interaction_data, indent=2)
             )
         
-        print(f"✓ Generated {len(interaction_data.get('questions', []))} questions")
-        print(f"   Summary: {interaction_data.get('summary', 'N/A')[:50]}...")
+        log.info("✓ Generated %s questions", len(interaction_data.get('questions', [])))
+        log.info("   Summary: %s...", interaction_data.get('summary', 'N/A')[:50])
         
     except Exception as e:
-        print(f"⚠ Interaction generation error: {e}")
+        log.warning("⚠ Interaction generation error: %s", e)
         interaction_data = {}
 
     # 7. REVIEW NODE
-    print("\n" + "=" * 70)
-    print("REVIEW (Review Agent)")
-    print("=" * 70)
+    log.info("\n" + "=" * 70)
+    log.info("REVIEW (Review Agent)")
+    log.info("=" * 70)
     try:
         review_response = review_chain.invoke({"html": html})
         review_data = safe_json_parse(review_response.content)
@@ -979,53 +1128,53 @@ def generate_simulation_with_checks(
         required_changes = review_data.get("required_changes", [])
         return_to = review_data.get("return_to", "none")
         
-        print(f"\nScores:")
+        log.info("\nScores:")
         for criterion, score in scores.items():
             status = "✓" if score >= 3 else "✗"
-            print(f"  {status} {criterion}: {score}/5")
+            log.info("  %s %s: %s/5", status, criterion, score)
         
         avg_score = sum(scores.values()) / len(scores) if scores else 0
-        print(f"\nAverage Score: {avg_score:.2f}/5.0")
-        print(f"Status: {'✅ APPROVED' if passed else '❌ NEEDS REVISION'}")
+        log.info("\nAverage Score: %.2f/5.0", avg_score)
+        log.info("Status: %s", '✅ APPROVED' if passed else '❌ NEEDS REVISION')
         
         if not passed:
-            print(f"Return to: {return_to.upper()}")
-            print("Required changes:")
+            log.info("Return to: %s", return_to.upper())
+            log.info("Required changes:")
             for change in required_changes[:5]:
-                print(f"  - {change}")
+                log.info("  - %s", change)
         
     except Exception as e:
-        print(f"⚠ Review failed: {e}")
+        log.warning("⚠ Review failed: %s", e)
         passed = False
 
     # 8. Save final output
     output_file = Path(output_path)
-    output_file.write_text(html, encoding="utf-8")
+    _atomic_write(output_file, html)
     
     if save_intermediates:
-        Path("5_final_output.html").write_text(html, encoding="utf-8")
+        _atomic_write(Path("5_final_output.html"), html)
         
         # Save review results
         if 'review_data' in locals():
-            Path("6_review_results.json").write_text(
-                json.dumps(review_data, indent=2),
-                encoding="utf-8"
+            _atomic_write(
+                Path("6_review_results.json"),
+                json.dumps(review_data, indent=2)
             )
 
     final_issues = check_minimum_requirements(html)
     
-    print("\n" + "=" * 70)
-    print("GENERATION COMPLETE")
-    print("=" * 70)
-    print(f"Output: {output_file.absolute()}")
-    print(f"File size: {len(html)} bytes")
+    log.info("\n" + "=" * 70)
+    log.info("GENERATION COMPLETE")
+    log.info("=" * 70)
+    log.info("Output: %s", output_file.absolute())
+    log.info("File size: %s bytes", len(html))
     
     if final_issues:
-        print(f"\n⚠ {len(final_issues)} validation issues:")
+        log.warning("\n⚠ %s validation issues:", len(final_issues))
         for issue in final_issues:
-            print(f"   - {issue}")
+            log.warning("   - %s", issue)
     else:
-        print("\n✓ All validation checks passed")
+        log.info("\n✓ All validation checks passed")
     
     return passed, html
 
@@ -1033,20 +1182,24 @@ def generate_simulation_with_checks(
 # ------------ CLI entry ------------
 
 if __name__ == "__main__":
-    base_dir = Path(__file__).parent
-    spec_path = base_dir / "spec.json"
-    output_path = base_dir / "index.html"
-
-    success, html = generate_simulation_with_checks(
-        spec_path=str(spec_path),
-        output_path=str(output_path),
-        save_intermediates=True,
-    )
-
-    print(f"\n{'=' * 70}")
-    if success:
-        print("✅ Simulation approved and ready for Class 7 students!")
-    else:
-        print("⚠ Simulation generated but needs revision.")
-    print(f"{'=' * 70}\n")
-    print(f"📄 Open {output_path} in a browser to test the simulation.")
\ No newline at end of file
+    listener = configure_logging(os.getenv("LOG_LEVEL", "INFO"))
+    try:
+        base_dir = Path(__file__).parent
+        spec_path = base_dir / "spec.json"
+        output_path = base_dir / "index.html"
+
+        success, html = generate_simulation_with_checks(
+            spec_path=str(spec_path),
+            output_path=str(output_path),
+            save_intermediates=True,
+        )
+
+        log.info("\n%s", '=' * 70)
+        if success:
+            log.info("✅ Simulation approved and ready for Class 7 students!")
+        else:
+            log.warning("⚠ Simulation generated but needs revision.")
+        log.info("%s\n", '=' * 70)
+        log.info("📄 Open %s in a browser to test the simulation.", output_path)
+    finally:
+        listener.stop()
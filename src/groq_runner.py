@@ -7,6 +7,7 @@ CLI wrapper that:
 """
 
 import os
+import asyncio
 import argparse
 from pathlib import Path
 from dotenv import load_dotenv
@@ -325,7 +326,7 @@ def main():
     print("Initializing LLM agents and chains...")
     chains = build_all_chains()
 
-    success, html, output_folder = generate_simulation_with_checks(
+    success, html, output_folder = asyncio.run(generate_simulation_with_checks(
         spec_path=spec_path,
         planner_chain=chains[0],
         creation_chain=chains[1],
@@ -335,7 +336,7 @@ def main():
         review_chain=chains[5],
         save_intermediates=save_intermediates,
         output_root=output_root,
-    )
+    ))
 
     print("\n" + "=" * 70)
     if success:
@@ -2,82 +2,330 @@
 """
 CLI wrapper that:
 - Loads environment variables
-- Builds the LLM agents (using ChatPromptTemplate + ChatGoogleGenerativeAI)
+- Builds the LLM agents (ChatPromptTemplate + one shared AsyncOpenAI client;
+  agents differ only in prompt, model and per-call temperature)
 - Parses CLI args, creates timestamped output folder and calls the orchestrator
 """
 
 import os
+import json
+import asyncio
+import logging
+import hashlib
+import sqlite3
+import uuid
 import argparse
 from pathlib import Path
 from dotenv import load_dotenv
+import httpx
+import openai
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
 
 # imports for langchain-style chains
+from langchain_core.messages import AIMessage, AIMessageChunk, convert_to_openai_messages
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 
 # orchestrator import
-from sim_generator import generate_simulation_with_checks
-
-load_dotenv()  # load .env
-
-def make_chain(prompt_template: str, llm_instance):
-    prompt = ChatPromptTemplate.from_template(prompt_template)
-    return prompt | llm_instance
-
-
-def build_all_chains():
-
-    base_url = "https://openrouter.ai/api/v1"
-
-    planner_llm = ChatOpenAI(
-        model="kwaipilot/kat-coder-pro:free",
-        temperature=0.3,
-        api_key=os.getenv("OPENROUTER_API_KEY"),
-        base_url=base_url,
-    )
-
-    creation_llm = ChatOpenAI(
-        model="kwaipilot/kat-coder-pro:free",
-        temperature=0,
-        api_key=os.getenv("OPENROUTER_API_KEY"),
-        base_url=base_url,
-    )
-
-    bugfix_llm = ChatOpenAI(
-        model="kwaipilot/kat-coder-pro:free",
-        temperature=0.2,
-        api_key=os.getenv("OPENROUTER_API_KEY"),
-        base_url=base_url,
-    )
-
-    student_interaction_llm = ChatOpenAI(
-        model="kwaipilot/kat-coder-pro:free",
-        temperature=0.6,
-        api_key=os.getenv("OPENROUTER_API_KEY"),
-        base_url=base_url,
-    )
-
-    incorporate_feedback_llm = ChatOpenAI(
-        model="kwaipilot/kat-coder-pro:free",
-        temperature=0.2,
-        api_key=os.getenv("OPENROUTER_API_KEY"),
-        base_url=base_url,
-    )
-
-    review_llm = ChatOpenAI(
-        model="kwaipilot/kat-coder-pro:free",
-        temperature=0.1,
-        api_key=os.getenv("OPENROUTER_API_KEY"),
-        base_url=base_url,
-    )
-
-
-    planner_prompt = """
+from sim_generator import configure_logging, generate_simulation_with_checks, json_loads
+
+if not os.getenv("OPENROUTER_API_KEY"):
+    load_dotenv()  # only read .env when the key was not injected already
+_API_KEY = os.environ["OPENROUTER_API_KEY"]  # fail fast at import if it is missing
+
+log = logging.getLogger("simgen")
+
+try:
+    import h2  # noqa: F401  (HTTP/2 support for httpx)
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+_BASE_URL = "https://openrouter.ai/api/v1"
+
+# One pooled async client under a single AsyncOpenAI client, so DNS, TCP and
+# TLS setup to OpenRouter is paid once and HTTP/2 (when h2 is installed)
+# multiplexes every agent's requests over one connection. Both are tied to
+# the event loop that first uses them, so they are created lazily inside the
+# run and dropped by close_clients() when it ends.
+_HTTP_CLIENT = None
+_OPENAI_CLIENT = None
+_SEM = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """The pooled connection to OpenRouter for the current run."""
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None:
+        _HTTP_CLIENT = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            http2=_HTTP2,
+            timeout=120,
+        )
+    return _HTTP_CLIENT
+
+
+def get_openai_client() -> openai.AsyncOpenAI:
+    """
+    The only LLM client: every chain calls through it and passes its own
+    temperature per request. Prompts are still formatted with
+    ChatPromptTemplate but the Runnable/callback machinery is skipped.
+    """
+    global _OPENAI_CLIENT
+    if _OPENAI_CLIENT is None:
+        _OPENAI_CLIENT = openai.AsyncOpenAI(
+            base_url=_BASE_URL,
+            api_key=_API_KEY,
+            http_client=get_http_client(),
+        )
+    return _OPENAI_CLIENT
+
+
+def get_semaphore() -> asyncio.Semaphore:
+    """Caps in-flight OpenRouter requests across all agents so concurrent stages
+    stay under the per-key rate limit instead of tripping 429s."""
+    global _SEM
+    if _SEM is None:
+        _SEM = asyncio.Semaphore(int(os.getenv("OPENROUTER_MAX_CONCURRENCY", "5")))
+    return _SEM
+
+
+async def close_clients() -> None:
+    """Close the pooled connection and forget the loop-bound client state."""
+    global _HTTP_CLIENT, _OPENAI_CLIENT, _SEM
+    if _HTTP_CLIENT is not None:
+        await _HTTP_CLIENT.aclose()
+    _HTTP_CLIENT = _OPENAI_CLIENT = _SEM = None
+
+
+_BACKOFF = wait_exponential_jitter(initial=1, max=30)
+
+
+def _wait_for_retry(retry_state) -> float:
+    """Honour the retry-after header on a 429, else back off with jitter."""
+    exc = retry_state.outcome.exception()
+    response = getattr(exc, "response", None)
+    if response is not None:
+        try:
+            return float(response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+    return _BACKOFF(retry_state)
+
+
+# Every prompt asks for a single JSON object; JSON mode makes the provider
+# enforce that instead of relying on the model to skip prose and fences.
+_JSON_MODE = {"type": "json_object"}
+
+
+class OpenRouterChain:
+    """Formats a prompt template and sends it straight to chat.completions."""
+
+    def __init__(self, prompt: ChatPromptTemplate, model: str, temperature: float):
+        self.prompt = prompt
+        self.model = model
+        self.temperature = temperature
+
+    async def ainvoke(self, inputs: dict):
+        messages = self.prompt.format_messages(**inputs)
+        completion = await get_openai_client().chat.completions.create(
+            model=self.model,
+            temperature=self.temperature,
+            messages=convert_to_openai_messages(messages),
+            response_format=_JSON_MODE,
+        )
+        return AIMessage(content=completion.choices[0].message.content or "")
+
+    async def astream(self, inputs: dict):
+        messages = self.prompt.format_messages(**inputs)
+        stream = await get_openai_client().chat.completions.create(
+            model=self.model,
+            temperature=self.temperature,
+            messages=convert_to_openai_messages(messages),
+            response_format=_JSON_MODE,
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield AIMessageChunk(content=chunk.choices[0].delta.content)
+
+
+class RateLimitedChain:
+    """Chain wrapper: bounded by the shared semaphore and retried on rate limits."""
+
+    def __init__(self, runnable):
+        self.runnable = runnable
+
+    @staticmethod
+    def _retrying():
+        return AsyncRetrying(
+            stop=stop_after_attempt(5),
+            wait=_wait_for_retry,
+            retry=retry_if_exception_type(openai.RateLimitError),
+            reraise=True,
+        )
+
+    async def ainvoke(self, inputs: dict):
+        async for attempt in self._retrying():
+            with attempt:
+                async with get_semaphore():
+                    return await self.runnable.ainvoke(inputs)
+
+    async def astream(self, inputs: dict):
+        # a 429 arrives before the first token, so only that part is retried
+        async with get_semaphore():
+            async for attempt in self._retrying():
+                with attempt:
+                    stream = self.runnable.astream(inputs)
+                    first = await anext(stream, None)
+            if first is None:
+                return
+            yield first
+            async for chunk in stream:
+                yield chunk
+
+
+class ResponseCache:
+    """Small SQLite key/value store for LLM response text."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content TEXT NOT NULL)"
+        )
+
+    def get(self, key: str):
+        row = self._conn.execute(
+            "SELECT content FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, content: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses (key, content) VALUES (?, ?)", (key, content)
+        )
+        self._conn.commit()
+
+
+class CachedChain:
+    """
+    Exact-match response cache in front of a chain: the key is a blake2b hash of
+    model + prompt template + inputs, so a repeated spec skips the LLM entirely.
+    """
+
+    def __init__(self, chain, prompt: ChatPromptTemplate, model: str, cache: ResponseCache):
+        self.chain = chain
+        self.key_prefix = model + "\0" + prompt.pretty_repr()
+        self.input_variables = frozenset(prompt.input_variables)
+        self.cache = cache
+
+    def _key(self, inputs: dict) -> str:
+        # only the variables the template consumes can change the response
+        used = {k: v for k, v in inputs.items() if k in self.input_variables}
+        payload = self.key_prefix + json.dumps(used, sort_keys=True, ensure_ascii=False)
+        return hashlib.blake2b(payload.encode("utf-8")).hexdigest()
+
+    async def ainvoke(self, inputs: dict):
+        key = self._key(inputs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return AIMessage(content=cached)
+
+        response = await self.chain.ainvoke(inputs)
+        if isinstance(response.content, str):
+            self.cache.put(key, response.content)
+        return response
+
+    async def astream(self, inputs: dict):
+        key = self._key(inputs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield AIMessageChunk(content=cached)
+            return
+
+        parts = []
+        async for chunk in self.chain.astream(inputs):
+            parts.append(chunk.content)
+            yield chunk
+        self.cache.put(key, "".join(parts))
+
+
+class BatchChain:
+    """
+    Sends one request through the OpenAI-style Batch API (files + batches) for
+    the discounted rate and polls until it finishes. Falls back to a direct
+    call when the provider rejects the batch or it does not complete.
+    """
+
+    def __init__(self, chain: OpenRouterChain, fallback, poll_seconds: float = 30):
+        self.chain = chain
+        self.fallback = fallback
+        self.poll_seconds = poll_seconds
+
+    async def _run_batch(self, inputs: dict) -> AIMessage:
+        custom_id = uuid.uuid4().hex
+        request = {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": self.chain.model,
+                "temperature": self.chain.temperature,
+                "messages": convert_to_openai_messages(self.chain.prompt.format_messages(**inputs)),
+                "response_format": _JSON_MODE,
+            },
+        }
+        batch_file = await get_openai_client().files.create(
+            file=("batch.jsonl", (json.dumps(request) + "\n").encode("utf-8")),
+            purpose="batch",
+        )
+        batch = await get_openai_client().batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(self.poll_seconds)
+            batch = await get_openai_client().batches.retrieve(batch.id)
+
+        if batch.status != "completed" or not batch.output_file_id:
+            raise RuntimeError(f"batch {batch.id} ended with status {batch.status}")
+
+        output = await get_openai_client().files.content(batch.output_file_id)
+        for line in output.text.splitlines():
+            result = json.loads(line)
+            if result.get("custom_id") == custom_id:
+                return AIMessage(content=result["response"]["body"]["choices"][0]["message"]["content"])
+        raise RuntimeError(f"batch {batch.id} has no result for {custom_id}")
+
+    async def ainvoke(self, inputs: dict):
+        try:
+            return await self._run_batch(inputs)
+        except (openai.APIError, RuntimeError, KeyError) as e:
+            log.warning("⚠ Batch request failed (%s); calling the model directly", e)
+            return await self.fallback.ainvoke(inputs)
+
+
+def make_chain(prompt: ChatPromptTemplate, model: str, temperature: float,
+               cache: ResponseCache = None):
+    # OpenRouterChain holds no connection state, just the per-call settings
+    chain = RateLimitedChain(OpenRouterChain(prompt, model, temperature))
+    if cache is not None:
+        chain = CachedChain(chain, prompt, model, cache)
+    return chain
+
+
+# ---------- Prompt templates ----------
+# System instructions; parsed once at import, build_all_chains() only attaches
+# model settings to them.
+
+PLANNER_PROMPT = """
 You are an expert Simulation Planner for CBSE Class 7 students.
 
-Input spec.json:
-{spec_json}
-
 Create a detailed, pedagogically sound blueprint that prioritizes VISUAL LEARNING over text.
 
 CRITICAL REQUIREMENTS:
@@ -159,13 +407,10 @@ CRITICAL OUTPUT RULES:
 - Ensure valid JSON syntax (proper quotes, commas, brackets)
 """
 
-    creation_prompt = """
+CREATION_PROMPT = """
 You are an expert HTML Simulation Generator specializing in visual, interactive educational content.
 
-INPUTS:
-Blueprint: {plan}
-
-YOUR MISSION: Create a COMPLETE, SELF-CONTAINED, MOBILE-FIRST HTML simulation that works perfectly on small screens.
+YOUR MISSION: Create a SELF-CONTAINED, MOBILE-FIRST HTML simulation that works perfectly on small screens.
 
 CRITICAL LAYOUT REQUIREMENTS:
 1. Container Structure:
@@ -241,147 +486,36 @@ CRITICAL LAYOUT REQUIREMENTS:
    - Use CSS transforms (not top/left) for animations
    - Keep JavaScript minimal and efficient
 
-MANDATORY HTML STRUCTURE:
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>[Concept Name] - Interactive Simulation</title>
-    <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{ 
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
-            line-height: 1.6;
-            color: #333;
-            background: #f9f9f9;
-        }}
-        #app {{ 
-            max-width: 600px; 
-            margin: 0 auto; 
-            padding: 16px; 
-            background: white;
-            min-height: 100vh;
-        }}
-        header {{
-            padding: 16px 0;
-            text-align: center;
-            border-bottom: 2px solid #e0e0e0;
-        }}
-        h1 {{ font-size: 24px; margin-bottom: 8px; }}
-        .subtitle {{ font-size: 14px; color: #666; }}
-        
-        #visual-area {{
-            position: relative;
-            height: 50vh;
-            min-height: 300px;
-            background: #f5f5f5;
-            border-radius: 8px;
-            margin: 16px 0;
-            display: flex;
-            justify-content: center;
-            align-items: center;
-            overflow: hidden;
-        }}
-        
-        #controls {{
-            padding: 16px;
-            background: #fafafa;
-            border-radius: 8px;
-            margin: 16px 0;
-        }}
-        
-        .control-group {{
-            margin: 16px 0;
-        }}
-        
-        .control-label {{
-            display: flex;
-            justify-content: space-between;
-            margin-bottom: 8px;
-            font-weight: 500;
-        }}
-        
-        input[type="range"] {{
-            width: 100%;
-            height: 44px;
-            cursor: pointer;
-        }}
-        
-        button {{
-            width: 100%;
-            min-height: 48px;
-            padding: 12px;
-            font-size: 16px;
-            background: #4CAF50;
-            color: white;
-            border: none;
-            border-radius: 6px;
-            cursor: pointer;
-            margin: 8px 0;
-        }}
-        
-        button:active {{
-            transform: scale(0.98);
-        }}
-        
-        #info {{
-            padding: 16px;
-            background: #e3f2fd;
-            border-radius: 8px;
-            margin: 16px 0;
-        }}
-        
-        /* Add your specific visual styles here */
-    </style>
-</head>
-<body>
-    <div id="app">
-        <header>
-            <h1>[Your Title]</h1>
-            <p class="subtitle">[One line description]</p>
-        </header>
-        
-        <div id="visual-area">
-            <!-- Your SVG/Canvas visualization here with proper centering -->
-        </div>
-        
-        <div id="controls">
-            <!-- Your controls here -->
-        </div>
-        
-        <div id="info">
-            <!-- Current values and observations -->
-        </div>
-    </div>
-    
-    <script>
-        // Your JavaScript here
-        // Follow the blueprint's simulation_logic exactly
-    </script>
-</body>
-</html>
+PAGE SHELL (supplied by the runner - do NOT output it):
+The runner already provides <!DOCTYPE html>, the <head> with charset and viewport meta tags,
+base mobile-first CSS for #app, header, h1, .subtitle, #visual-area (flex-centered, 50vh),
+#controls, .control-group, .control-label, input[type="range"], button and #info, and the
+#app container with its header, #visual-area, #controls and #info divs.
+You only write the pieces that change per simulation.
 
 CRITICAL OUTPUT FORMAT:
 {{
-  "index.html": "<!DOCTYPE html>...[COMPLETE HTML AS SINGLE STRING WITH ESCAPED QUOTES]..."
+  "title": "Concept name",
+  "subtitle": "One line description",
+  "style": "CSS rules specific to this simulation (no <style> tag)",
+  "visual": "Inner HTML of #visual-area: the centered SVG/Canvas visualization",
+  "controls": "Inner HTML of #controls: .control-group blocks with labels and live values",
+  "info": "Inner HTML of #info: current values and observations",
+  "script": "JavaScript for the simulation (no <script> tag), following the blueprint's simulation_logic exactly"
 }}
 
 OUTPUT RULES:
 - Output ONLY valid JSON with the structure above
 - NO markdown code blocks (```)
 - NO commentary or explanations
-- The ENTIRE HTML must be a single string value for "index.html"
-- Escape all quotes inside the HTML: use \" for quotes inside the string
-- No newlines in the JSON (they can be in the HTML string with \\n)
+- Do NOT output <!DOCTYPE>, <html>, <head> or <body>; only the fragments above
+- Escape all quotes inside string values: use \" for quotes inside the string
+- No newlines in the JSON (they can be in string values with \\n)
 """
 
-    bugfix_prompt = """
+BUGFIX_PROMPT = """
 You are a Senior HTML/CSS/JS Debugger specializing in mobile-responsive simulations.
 
-INPUT HTML:
-{html}
-
 SYSTEMATIC BUG-FIX CHECKLIST:
 
 1. STRUCTURAL FIXES:
@@ -474,13 +608,9 @@ CRITICAL RULES:
 - List all fixes made in explanations array
 """
 
-    student_interaction_prompt = """
+STUDENT_INTERACTION_PROMPT = """
 You are an Educational Content Designer for CBSE Class 7 students.
 
-INPUTS:
-Spec: {spec_json}
-Blueprint: {plan}
-
 Create engaging, age-appropriate questions that test conceptual understanding.
 
 QUESTION DESIGN PRINCIPLES:
@@ -562,13 +692,9 @@ CRITICAL RULES:
 - correct_index must be 0, 1, 2, or 3
 """
 
-    incorporate_feedback_prompt = """
+INCORPORATE_FEEDBACK_PROMPT = """
 You are a Simulation Improvement Specialist.
 
-INPUTS:
-Current HTML: {html}
-Feedback: {feedback_text}
-
 Your task: Apply the requested improvements while maintaining quality and constraints.
 
 IMPROVEMENT PROCESS:
@@ -633,12 +759,9 @@ RULES:
 - Maintain all existing functionality
 """
 
-    review_prompt = """
+REVIEW_PROMPT = """
 You are a Senior Quality Assurance Specialist for educational simulations.
 
-INPUT HTML:
-{html}
-
 Conduct a comprehensive quality review using CBSE Class 7 standards.
 
 EVALUATION CRITERIA:
@@ -779,12 +902,89 @@ RULES:
 - Focus on student learning experience
 """
 
-    planner_chain = make_chain(planner_prompt, planner_llm)
-    creation_chain = make_chain(creation_prompt, creation_llm)
-    bugfix_chain = make_chain(bugfix_prompt, bugfix_llm)
-    student_interaction_chain = make_chain(student_interaction_prompt, student_interaction_llm)
-    incorporate_feedback_chain = make_chain(incorporate_feedback_prompt, incorporate_feedback_llm)
-    review_chain = make_chain(review_prompt, review_llm)
+# Per-request payloads go in the user message; the static instructions above
+# are sent verbatim as the system message so provider prompt caching can reuse them.
+PLANNER_INPUT = """Input spec.json:
+{spec_json}"""
+
+CREATION_INPUT = """INPUTS:
+Blueprint: {plan}"""
+
+BUGFIX_INPUT = """INPUT HTML:
+{html}"""
+
+STUDENT_INTERACTION_INPUT = """INPUTS:
+Spec: {spec_json}
+Blueprint: {plan}"""
+
+INCORPORATE_FEEDBACK_INPUT = """INPUTS:
+Current HTML: {html}
+Feedback: {feedback_text}"""
+
+REVIEW_INPUT = """INPUT HTML:
+{html}"""
+
+
+_PLANNER_PROMPT_TMPL = ChatPromptTemplate.from_messages(
+    [("system", PLANNER_PROMPT), ("user", PLANNER_INPUT)]
+)
+_CREATION_PROMPT_TMPL = ChatPromptTemplate.from_messages(
+    [("system", CREATION_PROMPT), ("user", CREATION_INPUT)]
+)
+_BUGFIX_PROMPT_TMPL = ChatPromptTemplate.from_messages(
+    [("system", BUGFIX_PROMPT), ("user", BUGFIX_INPUT)]
+)
+_STUDENT_INTERACTION_PROMPT_TMPL = ChatPromptTemplate.from_messages(
+    [("system", STUDENT_INTERACTION_PROMPT), ("user", STUDENT_INTERACTION_INPUT)]
+)
+_INCORPORATE_FEEDBACK_PROMPT_TMPL = ChatPromptTemplate.from_messages(
+    [("system", INCORPORATE_FEEDBACK_PROMPT), ("user", INCORPORATE_FEEDBACK_INPUT)]
+)
+_REVIEW_PROMPT_TMPL = ChatPromptTemplate.from_messages(
+    [("system", REVIEW_PROMPT), ("user", REVIEW_INPUT)]
+)
+
+
+async def warm_up_connection() -> None:
+    """Open the pooled TLS connection to OpenRouter before the first agent call."""
+    try:
+        # HEAD keeps the response tiny; any status is fine, only the socket matters
+        await get_http_client().head(_BASE_URL + "/models", timeout=5)
+    except httpx.HTTPError:
+        pass
+
+
+async def generate_with_warm_up(**kwargs):
+    """Run the orchestrator while the warm-up request opens the connection."""
+    warm_up = asyncio.create_task(warm_up_connection())
+    try:
+        return await generate_simulation_with_checks(**kwargs)
+    finally:
+        warm_up.cancel()
+        await close_clients()
+
+
+def build_all_chains(use_cache: bool = False, batch_review: bool = False):
+
+    model = "kwaipilot/kat-coder-pro:free"
+    # checklist-style stages can run on a smaller, faster model
+    bugfix_model = os.getenv("BUGFIX_MODEL", "meta-llama/llama-3.1-8b-instruct:free")
+    review_model = os.getenv("REVIEW_MODEL", "google/gemini-flash-1.5")
+
+    cache = ResponseCache(os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite3")) if use_cache else None
+
+    planner_chain = make_chain(_PLANNER_PROMPT_TMPL, model, 0.3, cache)
+    creation_chain = make_chain(_CREATION_PROMPT_TMPL, model, 0, cache)
+    bugfix_chain = make_chain(_BUGFIX_PROMPT_TMPL, bugfix_model, 0.2, cache)
+    student_interaction_chain = make_chain(_STUDENT_INTERACTION_PROMPT_TMPL, model, 0.6, cache)
+    incorporate_feedback_chain = make_chain(_INCORPORATE_FEEDBACK_PROMPT_TMPL, model, 0.2, cache)
+    review_chain = make_chain(_REVIEW_PROMPT_TMPL, review_model, 0.1, cache)
+    if batch_review:
+        review_chain = BatchChain(
+            OpenRouterChain(_REVIEW_PROMPT_TMPL, review_model, 0.1),
+            fallback=review_chain,
+            poll_seconds=float(os.getenv("BATCH_POLL_SECONDS", "30")),
+        )
 
     return (
         planner_chain,
@@ -796,6 +996,38 @@ RULES:
     )
 
 
+def run(
+    spec_path,
+    output_root: str = "output",
+    save_intermediates: bool = True,
+    use_cache: bool = False,
+    batch_review: bool = False,
+):
+    """
+    Library entry point: generate one simulation without going through argparse.
+    Raises FileNotFoundError / json.JSONDecodeError for a missing or malformed spec.
+    Returns (passed, html, output_folder) like the orchestrator.
+    """
+    spec_path = Path(spec_path)
+    spec_data = json_loads(spec_path.read_bytes())
+
+    log.info("Initializing LLM agents and chains...")
+    chains = build_all_chains(use_cache=use_cache, batch_review=batch_review)
+
+    return asyncio.run(generate_with_warm_up(
+        spec_path=str(spec_path),
+        spec=spec_data,
+        planner_chain=chains[0],
+        creation_chain=chains[1],
+        bugfix_chain=chains[2],
+        student_interaction_chain=chains[3],
+        incorporate_feedback_chain=chains[4],
+        review_chain=chains[5],
+        save_intermediates=save_intermediates,
+        output_root=output_root,
+    ))
+
+
 def main():
     parser = argparse.ArgumentParser(description="Run the CBSE Class 7 simulation generator.")
     parser.add_argument("--spec", "-s", type=str, default="spec.json",
@@ -804,41 +1036,42 @@ def main():
                         help="Root directory where timestamped outputs will be saved.")
     parser.add_argument("--no-save-intermediates", action="store_true",
                         help="If set, do not save intermediate node outputs.")
+    parser.add_argument("--cache", action="store_true",
+                        help="Reuse cached LLM responses for identical prompts (stored in LLM_CACHE_PATH).")
+    parser.add_argument("--batch", action="store_true",
+                        help="Submit the review step through the Batch API (cheaper, can take hours).")
     args = parser.parse_args()
 
-    spec_path = args.spec
-    output_root = args.output_root
-    save_intermediates = not args.no_save_intermediates
-
-    if not Path(spec_path).exists():
-        print(f"Spec not found: {spec_path}")
+    try:
+        success, html, output_folder = run(
+            args.spec,
+            output_root=args.output_root,
+            save_intermediates=not args.no_save_intermediates,
+            use_cache=args.cache,
+            batch_review=args.batch,
+        )
+    except FileNotFoundError:
+        log.error("Spec not found: %s", args.spec)
+        return
+    except json.JSONDecodeError as e:
+        log.error("Spec is not valid JSON: %s (%s)", args.spec, e)
         return
 
-    print("Initializing LLM agents and chains...")
-    chains = build_all_chains()
-
-    success, html, output_folder = generate_simulation_with_checks(
-        spec_path=spec_path,
-        planner_chain=chains[0],
-        creation_chain=chains[1],
-        bugfix_chain=chains[2],
-        student_interaction_chain=chains[3],
-        incorporate_feedback_chain=chains[4],
-        review_chain=chains[5],
-        save_intermediates=save_intermediates,
-        output_root=output_root,
-    )
-
-    print("\n" + "=" * 70)
+    final_file = output_folder / "5_final_output.html"
+    log.info("\n%s", "=" * 70)
     if success:
-        print("✅ Simulation approved and ready for Class 7 students!")
+        log.info("✅ Simulation approved and ready for Class 7 students!")
     else:
-        print("⚠ Simulation generated but needs revision.")
-    print("=" * 70)
-    print(f"📁 All outputs saved to: {output_folder}")
-    print(f"📄 Main file: {output_folder / '5_final_output.html'}")
-    print(f"\n💡 Open {output_folder / '5_final_output.html'} in a browser to view the simulation")
+        log.warning("⚠ Simulation generated but needs revision.")
+    log.info("%s", "=" * 70)
+    log.info("📁 All outputs saved to: %s", output_folder)
+    log.info("📄 Main file: %s", final_file)
+    log.info("\n💡 Open %s in a browser to view the simulation", final_file)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    listener = configure_logging(os.getenv("LOG_LEVEL", "INFO"))
+    try:
+        main()
+    finally:
+        listener.stop()
@@ -2,72 +2,127 @@
 """
 CLI wrapper that:
 - Loads environment variables
-- Builds the LLM agents (using ChatPromptTemplate + ChatGoogleGenerativeAI)
+- Builds the LLM agents (pre-split prompt templates + ChatGoogleGenerativeAI)
 - Parses CLI args, creates timestamped output folder and calls the orchestrator
 """
 
 import os
+import glob
+import asyncio
 import argparse
+from functools import partial
+from string import Formatter
+from typing import Dict, List, Tuple
 from pathlib import Path
 from dotenv import load_dotenv
+import httpx
 
 # imports for langchain-style chains (same as original)
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
 from langchain_google_genai import ChatGoogleGenerativeAI
 
 # orchestrator import
-from sim_generator import generate_simulation_with_checks
+from sim_generator import configure_logging, generate_simulation_with_checks
 
 load_dotenv()  # load .env
-
-def make_chain(prompt_template: str, llm_instance):
-    prompt = ChatPromptTemplate.from_template(prompt_template)
-    return prompt | llm_instance
+_API_KEY = os.getenv("GOOGLE_API_KEY")
+
+try:
+    import h2  # noqa: F401  (HTTP/2 support for httpx)
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+# One pooled transport shared by every ChatGoogleGenerativeAI instance: each
+# google-genai client wraps it in its own httpx client, but connections (and
+# their TLS sessions) to generativelanguage.googleapis.com live here, so all
+# agents reuse the same keep-alive pool. The agents are only called async.
+_HTTP_TRANSPORT = httpx.AsyncHTTPTransport(
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+    http2=_HTTP2,
+)
+_CLIENT_ARGS = {"transport": _HTTP_TRANSPORT, "timeout": 60}
+
+
+# One client per (model, temperature): agents with identical settings (bugfix
+# and incorporate-feedback) share an instance and its genai client.
+_LLM_POOL: Dict[Tuple[str, float], ChatGoogleGenerativeAI] = {}
+
+
+def get_llm(model: str, temperature: float) -> ChatGoogleGenerativeAI:
+    """Return the pooled client for (model, temperature), creating it on first use."""
+    key = (model, float(temperature))
+    llm = _LLM_POOL.get(key)
+    if llm is None:
+        llm = _LLM_POOL[key] = ChatGoogleGenerativeAI(
+            model=model,
+            temperature=temperature,
+            api_key=_API_KEY,
+            client_args=_CLIENT_ARGS,
+        )
+    return llm
+
+
+def split_template(template: str) -> List[Tuple[str, str]]:
+    """Parse a format-style template once into (literal, field) pairs; {{ }} are unescaped."""
+    return [(literal, field) for literal, field, _, _ in Formatter().parse(template)]
+
+
+def make_chain(system_template: str, human_template: str, model: str, temperature: float):
+    # Static instructions go in the system message and only the per-request
+    # inputs in the human message, so the repeated prefix is identical across
+    # calls and eligible for Gemini's implicit context caching.
+    # Both templates are parsed here, once, so a call is just a join of the
+    # literal pieces around the inputs instead of a format pass over the prompt.
+    system_message = SystemMessage(content="".join(lit for lit, _ in split_template(system_template)))
+    human_parts = split_template(human_template)
+
+    def build_messages(inputs: dict):
+        content = "".join(lit + (str(inputs[field]) if field else "") for lit, field in human_parts)
+        return [system_message, HumanMessage(content=content)]
+
+    return RunnableLambda(build_messages) | get_llm(model, temperature)
+
+
+class LazyChain:
+    """Builds its chain on first call, so agents a run never reaches cost nothing."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._chain = None
+
+    @property
+    def chain(self):
+        if self._chain is None:
+            self._chain = self._factory()
+        return self._chain
+
+    async def ainvoke(self, inputs: dict, **kwargs):
+        return await self.chain.ainvoke(inputs, **kwargs)
+
+    def astream(self, inputs: dict, **kwargs):
+        return self.chain.astream(inputs, **kwargs)
+
+
+async def run_specs(spec_paths, **kwargs):
+    """
+    Run the orchestrator for every spec concurrently (the agents are shared),
+    then close the shared pool on the same event loop.
+    """
+    try:
+        return await asyncio.gather(*(
+            generate_simulation_with_checks(spec_path=str(path), **kwargs)
+            for path in spec_paths
+        ))
+    finally:
+        await _HTTP_TRANSPORT.aclose()
 
 
 def build_all_chains():
-    planner_llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0.3,
-        api_key=os.getenv("GOOGLE_API_KEY")
-    )
-
-    creation_llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0,
-        api_key=os.getenv("GOOGLE_API_KEY"),
-    )
-
-    bugfix_llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash-lite",
-        temperature=0.2,
-        api_key=os.getenv("GOOGLE_API_KEY"),
-    )
-
-    student_interaction_llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash-lite",
-        temperature=0.6,
-        api_key=os.getenv("GOOGLE_API_KEY"),
-    )
-
-    incorporate_feedback_llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash-lite",
-        temperature=0.2,
-        api_key=os.getenv("GOOGLE_API_KEY"),
-    )
-
-    review_llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash-lite",
-        temperature=0.1,
-        api_key=os.getenv("GOOGLE_API_KEY"),
-    )
-
     planner_prompt = """
 You are an expert Simulation Planner for CBSE Class 7 students.
 
-Input spec.json:
-{spec_json}
-
 Create a detailed, pedagogically sound blueprint that prioritizes VISUAL LEARNING over text.
 
 CRITICAL REQUIREMENTS:
@@ -148,13 +203,12 @@ CRITICAL OUTPUT RULES:
 - ALL fields must be present
 - Ensure valid JSON syntax (proper quotes, commas, brackets)
 """
+    planner_input = """Input spec.json:
+{spec_json}"""
 
     creation_prompt = """
 You are an expert HTML Simulation Generator specializing in visual, interactive educational content.
 
-INPUTS:
-Blueprint: {plan}
-
 YOUR MISSION: Create a COMPLETE, SELF-CONTAINED, MOBILE-FIRST HTML simulation that works perfectly on small screens.
 
 CRITICAL LAYOUT REQUIREMENTS:
@@ -365,13 +419,12 @@ OUTPUT RULES:
 - Escape all quotes inside the HTML: use \" for quotes inside the string
 - No newlines in the JSON (they can be in the HTML string with \\n)
 """
+    creation_input = """INPUTS:
+Blueprint: {plan}"""
 
     bugfix_prompt = """
 You are a Senior HTML/CSS/JS Debugger specializing in mobile-responsive simulations.
 
-INPUT HTML:
-{html}
-
 SYSTEMATIC BUG-FIX CHECKLIST:
 
 1. STRUCTURAL FIXES:
@@ -463,14 +516,12 @@ CRITICAL RULES:
 - Provide complete corrected HTML
 - List all fixes made in explanations array
 """
+    bugfix_input = """INPUT HTML:
+{html}"""
 
     student_interaction_prompt = """
 You are an Educational Content Designer for CBSE Class 7 students.
 
-INPUTS:
-Spec: {spec_json}
-Blueprint: {plan}
-
 Create engaging, age-appropriate questions that test conceptual understanding.
 
 QUESTION DESIGN PRINCIPLES:
@@ -551,14 +602,13 @@ CRITICAL RULES:
 - All questions must be MCQ type
 - correct_index must be 0, 1, 2, or 3
 """
+    student_interaction_input = """INPUTS:
+Spec: {spec_json}
+Blueprint: {plan}"""
 
     incorporate_feedback_prompt = """
 You are a Simulation Improvement Specialist.
 
-INPUTS:
-Current HTML: {html}
-Feedback: {feedback_text}
-
 Your task: Apply the requested improvements while maintaining quality and constraints.
 
 IMPROVEMENT PROCESS:
@@ -622,13 +672,13 @@ RULES:
 - Document every change made
 - Maintain all existing functionality
 """
+    incorporate_feedback_input = """INPUTS:
+Current HTML: {html}
+Feedback: {feedback_text}"""
 
     review_prompt = """
 You are a Senior Quality Assurance Specialist for educational simulations.
 
-INPUT HTML:
-{html}
-
 Conduct a comprehensive quality review using CBSE Class 7 standards.
 
 EVALUATION CRITERIA:
@@ -768,13 +818,15 @@ RULES:
 - Provide actionable feedback
 - Focus on student learning experience
 """
+    review_input = """INPUT HTML:
+{html}"""
 
-    planner_chain = make_chain(planner_prompt, planner_llm)
-    creation_chain = make_chain(creation_prompt, creation_llm)
-    bugfix_chain = make_chain(bugfix_prompt, bugfix_llm)
-    student_interaction_chain = make_chain(student_interaction_prompt, student_interaction_llm)
-    incorporate_feedback_chain = make_chain(incorporate_feedback_prompt, incorporate_feedback_llm)
-    review_chain = make_chain(review_prompt, review_llm)
+    planner_chain = LazyChain(partial(make_chain, planner_prompt, planner_input, "gemini-2.5-flash", 0.3))
+    creation_chain = LazyChain(partial(make_chain, creation_prompt, creation_input, "gemini-2.5-flash", 0))
+    bugfix_chain = LazyChain(partial(make_chain, bugfix_prompt, bugfix_input, "gemini-2.5-flash-lite", 0.2))
+    student_interaction_chain = LazyChain(partial(make_chain, student_interaction_prompt, student_interaction_input, "gemini-2.5-flash-lite", 0.6))
+    incorporate_feedback_chain = LazyChain(partial(make_chain, incorporate_feedback_prompt, incorporate_feedback_input, "gemini-2.5-flash-lite", 0.2))
+    review_chain = LazyChain(partial(make_chain, review_prompt, review_input, "gemini-2.5-flash-lite", 0.1))
 
     return (
         planner_chain,
@@ -794,41 +846,61 @@ def main():
                         help="Root directory where timestamped outputs will be saved.")
     parser.add_argument("--no-save-intermediates", action="store_true",
                         help="If set, do not save intermediate node outputs.")
+    parser.add_argument("--cache", action="store_true",
+                        help="Reuse the approved output of a previous run with an identical spec "
+                             "(stored under OUTPUT_ROOT/.cache).")
+    parser.add_argument("--spec-glob", type=str, default=None,
+                        help="Glob of spec files to generate concurrently, e.g. 'specs/*.json' "
+                             "(overrides --spec).")
     args = parser.parse_args()
 
-    spec_path = args.spec
-    output_root = args.output_root
-    save_intermediates = not args.no_save_intermediates
-
-    if not Path(spec_path).exists():
-        print(f"Spec not found: {spec_path}")
+    if not _API_KEY:
+        print("GOOGLE_API_KEY is not set (export it or add it to .env)")
         return
 
+    if args.spec_glob:
+        spec_paths = [Path(p) for p in sorted(glob.glob(args.spec_glob))]
+        if not spec_paths:
+            print(f"No specs match: {args.spec_glob}")
+            return
+    else:
+        spec_paths = [Path(args.spec)]
+        if not spec_paths[0].exists():
+            print(f"Spec not found: {args.spec}")
+            return
+
     print("Initializing LLM agents and chains...")
     chains = build_all_chains()
 
-    success, html, output_folder = generate_simulation_with_checks(
-        spec_path=spec_path,
+    results = asyncio.run(run_specs(
+        spec_paths,
         planner_chain=chains[0],
         creation_chain=chains[1],
         bugfix_chain=chains[2],
         student_interaction_chain=chains[3],
         incorporate_feedback_chain=chains[4],
         review_chain=chains[5],
-        save_intermediates=save_intermediates,
-        output_root=output_root,
-    )
-
-    print("\n" + "=" * 70)
-    if success:
-        print("✅ Simulation approved and ready for Class 7 students!")
-    else:
-        print("⚠ Simulation generated but needs revision.")
-    print("=" * 70)
-    print(f"📁 All outputs saved to: {output_folder}")
-    print(f"📄 Main file: {output_folder / '5_final_output.html'}")
-    print(f"\n💡 Open {output_folder / '5_final_output.html'} in a browser to view the simulation")
-
+        save_intermediates=not args.no_save_intermediates,
+        output_root=args.output_root,
+        use_run_cache=args.cache,
+    ))
+
+    for spec_path, (success, html, output_folder) in zip(spec_paths, results):
+        print("\n" + "=" * 70)
+        if len(spec_paths) > 1:
+            print(f"Spec: {spec_path}")
+        if success:
+            print("✅ Simulation approved and ready for Class 7 students!")
+        else:
+            print("⚠ Simulation generated but needs revision.")
+        print("=" * 70)
+        print(f"📁 All outputs saved to: {output_folder}")
+        print(f"📄 Main file: {output_folder / '5_final_output.html'}")
+        print(f"\n💡 Open {output_folder / '5_final_output.html'} in a browser to view the simulation")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    listener = configure_logging(os.getenv("LOG_LEVEL", "INFO"))
+    try:
+        main()
+    finally:
+        listener.stop()
\ No newline at end of file
@@ -5,23 +5,112 @@ Simulation generation logic and orchestration.
 Saves all node outputs into a timestamped directory under `output/`:
   output/YYYY-MM-DD_HH-MM-SS/
 
-This module expects chain-like objects with an `invoke(kwargs: dict)` method
-that returns an object having `.content` (same shape as your original script).
+This module expects chain-like objects with an async `ainvoke(kwargs: dict)`
+method that returns an object having `.content` (any LangChain runnable works).
+Chains that also expose `astream(kwargs: dict)` are streamed for the creator
+and bugfix stages. Progress is reported through the `sim_generator` logger;
+call `configure_logging()` to see it.
 """
 
+import asyncio
+import hashlib
+import io
 import json
+import logging
+import os
+import queue
+import sys
+import threading
+import zipfile
+from contextlib import contextmanager, nullcontext
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, Iterator, List, Optional, TextIO, Tuple
 import re
+import shutil
 from datetime import datetime
+from functools import lru_cache
 
+try:
+    import orjson
+except ImportError:  # optional: faster JSON parsing when installed
+    orjson = None
+
+
+log = logging.getLogger(__name__)
 
 # ---------- Utilities ----------
 
+def configure_logging(level: str = "INFO") -> QueueListener:
+    """
+    Route log records through a queue so callers on the event loop never block
+    on terminal I/O; a listener thread writes them to stdout. Returns the
+    started listener (call .stop() on exit).
+    """
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    listener = QueueListener(log_queue, console)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(QueueHandler(log_queue))
+    listener.start()
+    return listener
+
+
 def load_spec(path: str) -> Dict[str, Any]:
     """Load spec JSON - expects single concept format"""
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return json_loads(Path(path).read_bytes())
+
+
+def find_json_object(text: str) -> Optional[str]:
+    """
+    Return the first balanced {...} block in `text`, or None.
+    Single linear pass tracking brace depth; braces inside JSON strings
+    (including escaped quotes) are ignored.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+def json_loads(text: str) -> Any:
+    """Parse JSON with orjson when available, else the stdlib."""
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+def json_dumps_bytes(data: Any) -> bytes:
+    """Indented UTF-8 JSON, ready for write_bytes (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+_HTML_START_RE = re.compile(r"<!doctype|<html", re.IGNORECASE)
+_HTML_HINT_RE = re.compile(r"<!doctype|<html|<style", re.IGNORECASE)
 
 
 def safe_json_parse(raw: Any) -> Dict[str, Any]:
@@ -48,40 +137,44 @@ def safe_json_parse(raw: Any) -> Dict[str, Any]:
     # Remove markdown code blocks if present
     if text.startswith("```"):
         text = text.strip("`").strip()
-        if text.lower().startswith("json"):
-            text = text[4:].lstrip()
-        elif text.lower().startswith("html"):
+        if text[:4].lower() in ("json", "html"):
             text = text[4:].lstrip()
+        if not text:
+            raise ValueError("safe_json_parse: LLM returned empty content.")
 
     # If the model returned raw HTML (common when it ignores the JSON wrapper), wrap it
-    stripped_lower = text.lstrip().lower()
-    if stripped_lower.startswith("<!doctype") or stripped_lower.startswith("<html"):
+    if _HTML_START_RE.match(text):
         return {"index.html": text}
 
-    # Try to find JSON object
-    match = re.search(r'\{(?:[^{}]|(?:\{[^{}]*\}))*\}', text, re.DOTALL)
-    if not match:
+    # JSON-mode replies are a bare object and go straight to the parser; anything
+    # else gets one brace-depth scan for the first balanced object
+    json_str = text if text[0] == "{" and text[-1] == "}" else find_json_object(text)
+    if json_str is None:
         first_brace = text.find('{')
         last_brace = text.rfind('}')
-        if first_brace != -1 and last_brace != -1 and last_brace > first_brace:
+        if first_brace != -1 and last_brace > first_brace:
             json_str = text[first_brace:last_brace + 1]
-        else:
+        elif _HTML_START_RE.search(text):
             # As last resort, if it looks like HTML, wrap it
-            if "<html" in text.lower() or "<!doctype" in text.lower():
-                return {"index.html": text}
+            return {"index.html": text}
+        else:
             snippet = text[:300].replace("\n", "\\n")
             raise ValueError(
                 f"safe_json_parse: Could not find JSON. First 300 chars: {snippet}"
             )
-    else:
-        json_str = match.group(0)
 
     try:
-        return json.loads(json_str)
-    except json.JSONDecodeError as e:
+        return json_loads(json_str)
+    except ValueError as e:
+        # a whole reply like "{...} trailing {...}" still holds a leading object
+        inner = find_json_object(text) if json_str is text else None
+        if inner is not None and len(inner) < len(text):
+            try:
+                return json_loads(inner)
+            except ValueError:
+                pass
         # Fallback: if the extracted snippet still looks like HTML, wrap it.
-        lower = json_str.lower()
-        if "<html" in lower or "<!doctype" in lower or "<style" in lower:
+        if _HTML_HINT_RE.search(json_str):
             return {"index.html": json_str}
         snippet = json_str[:300].replace("\n", "\\n")
         raise ValueError(
@@ -89,10 +182,30 @@ def safe_json_parse(raw: Any) -> Dict[str, Any]:
         ) from e
 
 
+SKELETON_PATH = Path(__file__).parent / "templates" / "skeleton.html"
+_SKELETON_SLOT = re.compile(r"\{\{(\w+)\}\}")
+
+
+@lru_cache(maxsize=1)
+def load_skeleton() -> str:
+    return SKELETON_PATH.read_text(encoding="utf-8")
+
+
+def render_skeleton(parts: Dict[str, Any]) -> str:
+    """Splice creator fragments (title, style, visual, controls, info, script) into the page shell."""
+    return _SKELETON_SLOT.sub(lambda m: str(parts.get(m.group(1), "")), load_skeleton())
+
+
+_DOCTYPE_RE = re.compile(r"<!doctype", re.IGNORECASE)
+_HTML_OPEN_RE = re.compile(r"<html", re.IGNORECASE)
+_HTML_END_RE = re.compile(r"</html\s*>", re.IGNORECASE)
+
+
 def extract_html_from_response(response_content: str) -> str:
     """
     Extract pure HTML from LLM response, handling various formats:
     - JSON wrapped: {"index.html": "..."}
+    - JSON fragments for the shared skeleton: {"style": ..., "script": ...}
     - Markdown wrapped: ```html ... ```
     - Raw HTML
     """
@@ -101,99 +214,132 @@ def extract_html_from_response(response_content: str) -> str:
     # Remove markdown code blocks
     if text.startswith("```"):
         text = text.strip("`").strip()
-        if text.lower().startswith("json"):
-            text = text[4:].lstrip()
-        elif text.lower().startswith("html"):
+        if text[:4].lower() in ("json", "html"):
             text = text[4:].lstrip()
     
     # If it's already HTML, return it
-    if text.lstrip().lower().startswith("<!doctype") or text.lstrip().lower().startswith("<html"):
+    if _HTML_START_RE.match(text):
         return text
     
     # Try to parse as JSON and extract index.html
     try:
-        data = json.loads(text)
+        data = json_loads(text)
         if isinstance(data, dict) and "index.html" in data:
             return data["index.html"]
+        if isinstance(data, dict) and "script" in data:
+            return render_skeleton(data)
     except json.JSONDecodeError:
         pass
     
-    # Try to find HTML within the text
-    lower = text.lower()
-    
-    # Look for <!doctype or <html
-    doctype_start = lower.find("<!doctype")
-    html_start = lower.find("<html")
-    
-    start_pos = -1
-    if doctype_start != -1:
-        start_pos = doctype_start
-    elif html_start != -1:
-        start_pos = html_start
-    
-    if start_pos != -1:
-        # Find the closing </html>
-        end_pos = lower.rfind("</html>")
+    # Try to find HTML within the text (case-insensitive, without lowercasing the buffer)
+    start_match = _DOCTYPE_RE.search(text) or _HTML_OPEN_RE.search(text)
+    if start_match:
+        start_pos = start_match.start()
+        end_pos = -1
+        for end in _HTML_END_RE.finditer(text, start_pos):
+            end_pos = end.end()
         if end_pos != -1:
-            return text[start_pos:end_pos + len("</html>")]
-        else:
-            # No closing tag found, return from start to end
-            return text[start_pos:]
+            return text[start_pos:end_pos]
+        # No closing tag found, return from start to end
+        return text[start_pos:]
     
     # If nothing worked, return the original text
     return text
 
 
+_CONTROL_MARKERS = ('<input', '<button', '<select', 'onclick', 'addEventListener')
+_REQUIREMENT_MARKERS = (
+    '<!DOCTYPE html>', '<!doctype html>', '<meta name="viewport"',
+    *_CONTROL_MARKERS, '<style>', 'style=',
+)
+# One alternation scanned in a single pass instead of a substring search per marker
+_REQUIREMENT_RE = re.compile("|".join(re.escape(m) for m in _REQUIREMENT_MARKERS))
+
+
 def check_minimum_requirements(html: str) -> List[str]:
     """Check single-file HTML requirements."""
     issues = []
+    found = set(_REQUIREMENT_RE.findall(html))
 
-    if "<!DOCTYPE html>" not in html and "<!doctype html>" not in html:
+    if "<!DOCTYPE html>" not in found and "<!doctype html>" not in found:
         issues.append("Missing DOCTYPE declaration.")
     
-    if '<meta name="viewport"' not in html:
+    if '<meta name="viewport"' not in found:
         issues.append("Missing viewport meta tag for mobile.")
 
     # Check for basic interactive elements
-    has_controls = any(control in html for control in [
-        '<input', '<button', '<select', 'onclick', 'addEventListener'
-    ])
-    if not has_controls:
+    if found.isdisjoint(_CONTROL_MARKERS):
         issues.append("No interactive controls found.")
 
     # Check for inline styles or minimal styling
-    if '<style>' not in html and 'style=' not in html:
+    if '<style>' not in found and 'style=' not in found:
         issues.append("No styling found (inline or embedded).")
 
     return issues
 
 
+# Issues enforce_minimum_requirements() repairs without the bugfix agent
+AUTO_FIXABLE_ISSUES = {
+    "Missing DOCTYPE declaration.",
+    "Missing viewport meta tag for mobile.",
+}
+
+_SCRIPT_TAG_RE = re.compile(r"<script\b", re.IGNORECASE)
+
+
+def static_review(html: str) -> Optional[Dict[str, Any]]:
+    """
+    Cheap pre-review for clearly broken output (no script, no controls).
+    Returns a failing review dict in the reviewer's shape, or None when the
+    review agent has to judge.
+    """
+    problems = []
+    if not _SCRIPT_TAG_RE.search(html):
+        problems.append("Add a <script> that drives the simulation.")
+    if "No interactive controls found." in check_minimum_requirements(html):
+        problems.append("Add interactive controls (sliders, buttons) for the simulation variables.")
+    if not problems:
+        return None
+    return {"scores": {}, "pass": False, "required_changes": problems, "source": "static_review"}
+
+
+_VIEWPORT_META = '<meta name="viewport" content="width=device-width, initial-scale=1.0">'
+_ENFORCE_ANCHOR_RE = re.compile(
+    r"<!doctype|<meta\s+name=[\"']viewport|<head(?:\s[^>]*)?>|<html(?:\s[^>]*)?>",
+    re.IGNORECASE,
+)
+
+
 def enforce_minimum_requirements(html: str) -> str:
     """
     Add minimal fixes if basic requirements are missing.
     Ensures viewport meta tag and DOCTYPE exist.
+    One scan finds every anchor and the result is assembled with a single
+    copy; when nothing is missing the input string is returned as is.
     """
-    lower = html.lower()
-    
-    # Add viewport if missing
-    if '<meta name="viewport"' not in lower:
-        insert = '<meta name="viewport" content="width=device-width, initial-scale=1.0">'
-        if "<head>" in lower:
-            html = html.replace("<head>", f"<head>\n    {insert}", 1)
-        elif "<HEAD>" in html:
-            html = html.replace("<HEAD>", f"<HEAD>\n    {insert}", 1)
-        else:
-            # Add a head section
-            if "<html>" in lower:
-                html = html.replace("<html>", f"<html>\n<head>\n    {insert}\n</head>", 1)
-            elif "<HTML>" in html:
-                html = html.replace("<HTML>", f"<HTML>\n<head>\n    {insert}\n</head>", 1)
-    
-    # Add DOCTYPE if missing
-    if "<!doctype" not in lower:
-        html = "<!DOCTYPE html>\n" + html
-    
-    return html
+    has_doctype = has_viewport = False
+    head_end = html_end = -1
+    for match in _ENFORCE_ANCHOR_RE.finditer(html):
+        tag = match.group(0)[:5].lower()
+        if tag == "<!doc":
+            has_doctype = True
+        elif tag == "<meta":
+            has_viewport = True
+        elif tag == "<head":
+            if head_end < 0:
+                head_end = match.end()
+        elif html_end < 0:
+            html_end = match.end()
+        if has_doctype and has_viewport:
+            break
+
+    prefix = "" if has_doctype else "<!DOCTYPE html>\n"
+    if not has_viewport and head_end >= 0:
+        return f"{prefix}{html[:head_end]}\n    {_VIEWPORT_META}{html[head_end:]}"
+    if not has_viewport and html_end >= 0:
+        # Add a head section
+        return f"{prefix}{html[:html_end]}\n<head>\n    {_VIEWPORT_META}\n</head>{html[html_end:]}"
+    return prefix + html if prefix else html
 
 
 def generate_default_blueprint_from_spec(spec: Dict[str, Any]) -> Dict[str, Any]:
@@ -289,15 +435,158 @@ def make_timestamped_output_dir(base_dir: str = "output", concept_name: str = No
         sanitized_concept = sanitize_filename(concept_name)
         folder_name = f"{folder_name}_{sanitized_concept}"
     
+    Path(base_dir).mkdir(parents=True, exist_ok=True)
+    # A replan (or another run) started in the same second gets _2, _3, ...
+    # instead of appending to the first pass's folder and archive
     root = Path(base_dir) / folder_name
-    root.mkdir(parents=True, exist_ok=True)
+    suffix = 1
+    while True:
+        try:
+            root.mkdir()
+            break
+        except FileExistsError:
+            suffix += 1
+            root = Path(base_dir) / f"{folder_name}_{suffix}"
     return root
 
 
+# ---------- Run cache ----------
+
+RUN_CACHE_FILES = ("5_final_output.html", "6_review_results.json")
+
+
+def run_cache_dir(output_root: str, spec_bytes: bytes) -> Path:
+    """Cache slot for a spec: output_root/.cache/<blake2b of the serialized spec>/"""
+    key = hashlib.blake2b(spec_bytes, digest_size=16).hexdigest()
+    return Path(output_root) / ".cache" / key
+
+
+def load_cached_run(cache_dir: Path, output_dir: Path) -> Optional[str]:
+    """Copy a cached approved run into output_dir; returns its HTML or None on a miss."""
+    if not all((cache_dir / name).exists() for name in RUN_CACHE_FILES):
+        return None
+    for name in RUN_CACHE_FILES:
+        shutil.copyfile(cache_dir / name, output_dir / name)
+    return (output_dir / "5_final_output.html").read_text(encoding="utf-8")
+
+
+def store_cached_run(cache_dir: Path, output_dir: Path) -> None:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for name in RUN_CACHE_FILES:
+        shutil.copyfile(output_dir / name, cache_dir / name)
+
+
+# ---------- Artifact writer ----------
+
+INTERMEDIATES_ARCHIVE = "intermediates.zip"
+
+
+class ArtifactWriter:
+    """
+    Saves run artifacts from worker threads so disk I/O overlaps the next
+    agent call. The final output and review (RUN_CACHE_FILES) are written as
+    loose files; every other artifact is packed into one intermediates.zip
+    instead of a dozen small files. flush() waits for every pending write and
+    finalizes the archive.
+    """
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = output_dir
+        self._pending: List[asyncio.Future] = []
+        self._archive: Optional[zipfile.ZipFile] = None
+        self._lock = threading.Lock()
+        self._last_text: Optional[str] = None
+        self._last_bytes = b""
+
+    def _open_archive(self) -> zipfile.ZipFile:
+        if self._archive is None:
+            self._archive = zipfile.ZipFile(
+                self.output_dir / INTERMEDIATES_ARCHIVE, "a",
+                compression=zipfile.ZIP_DEFLATED, compresslevel=1,
+            )
+        return self._archive
+
+    def _encode(self, text: str) -> bytes:
+        # creator, bugfix and final HTML are often the very same str object;
+        # encode it once and reuse the bytes for each of those files
+        if text is not self._last_text:
+            self._last_text, self._last_bytes = text, text.encode("utf-8")
+        return self._last_bytes
+
+    def _write_member(self, name: str, data: bytes) -> None:
+        with self._lock:
+            self._open_archive().writestr(name, data)
+
+    def save(self, name: str, data: Any) -> None:
+        if not isinstance(data, bytes):
+            data = self._encode(str(data))
+        if name in RUN_CACHE_FILES:
+            write = asyncio.to_thread((self.output_dir / name).write_bytes, data)
+        else:
+            write = asyncio.to_thread(self._write_member, name, data)
+        self._pending.append(asyncio.ensure_future(write))
+
+    @contextmanager
+    def open_text(self, name: str) -> Iterator[TextIO]:
+        """Collect streamed text in memory; it is saved as one member when closed."""
+        buffer = io.StringIO()
+        try:
+            yield buffer
+        finally:
+            self.save(name, buffer.getvalue())
+
+    async def flush(self) -> None:
+        pending, self._pending = self._pending, []
+        await asyncio.gather(*pending)
+        with self._lock:
+            if self._archive is not None:
+                self._archive.close()
+                self._archive = None
+
+
+# ---------- Chain helpers ----------
+
+# Caps in-flight agent calls across every concurrent run in this process, so a
+# bulk driver keeps a steady N requests going instead of bursting into 429s.
+_LLM_SEM = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "10")))
+
+
+async def _invoke(chain: Any, inputs: Dict[str, Any]) -> Any:
+    async with _LLM_SEM:
+        return await chain.ainvoke(inputs)
+
+
+async def stream_response(
+    chain: Any, inputs: Dict[str, Any], label: str, tee: Optional[TextIO] = None
+) -> Any:
+    """
+    Collect a streamed reply into one string so progress shows at first token
+    instead of after the whole document. Falls back to `ainvoke` for chains
+    without `astream`. With `tee`, the raw reply is written to that file
+    chunk by chunk as it arrives instead of being saved again afterwards.
+    """
+    if not hasattr(chain, "astream"):
+        response = await _invoke(chain, inputs)
+        if tee is not None:
+            tee.write(str(getattr(response, "content", response)))
+        return response
+
+    parts: List[str] = []
+    async with _LLM_SEM:
+        async for chunk in chain.astream(inputs):
+            text = str(getattr(chunk, "content", chunk))
+            if not parts:
+                log.info("  ↳ %s streaming...", label)
+            parts.append(text)
+            if tee is not None:
+                tee.write(text)
+    return "".join(parts)
+
+
 # ---------- Orchestrator ----------
 
-def generate_simulation_with_checks(
-    spec_path: str,
+async def generate_simulation_with_checks(
+    spec_path: Optional[str],
     planner_chain,
     creation_chain,
     bugfix_chain,
@@ -306,41 +595,60 @@ def generate_simulation_with_checks(
     review_chain,
     save_intermediates: bool = True,
     output_root: str = "output",
+    spec: Optional[Dict[str, Any]] = None,
+    use_run_cache: bool = False,
+    replan: bool = True,
 ) -> Tuple[bool, str, Path]:
     """
     Orchestrate generation using provided chain-like objects.
+    Pass an already parsed `spec` to skip reading `spec_path`.
+    With `use_run_cache`, an approved run for an identical spec is reused from
+    output_root/.cache/ instead of calling any agent.
+    After review, mid scores go through the feedback agent once and very low
+    scores restart from the planner once (disable with `replan=False`).
 
     All outputs are written to:
       output_root/YYYY-MM-DD_HH-MM-SS_ConceptName/
 
     Returns (passed: bool, html_text: str, output_folder: Path)
     """
-    print("=" * 70)
-    print("SIMULATION GENERATOR")
-    print("=" * 70)
+    log.info("=" * 70)
+    log.info("SIMULATION GENERATOR")
+    log.info("=" * 70)
     
     # 1. Load spec first to get concept name for folder
-    print("\n[1/7] Loading concept...")
+    log.info("\n[1/7] Loading concept...")
     try:
-        spec = load_spec(spec_path)
-        spec_json = json.dumps(spec, indent=2, ensure_ascii=False)
+        if spec is None:
+            spec = load_spec(spec_path)
+        spec_bytes = json_dumps_bytes(spec)
+        spec_json = spec_bytes.decode("utf-8")
         concept_name = spec.get('Concept', 'Unknown Concept')
-        print(f"✓ Concept: {concept_name}")
+        log.info("✓ Concept: %s", concept_name)
     except Exception as e:
-        print(f"✗ Failed to load: {e}")
+        log.warning("✗ Failed to load: %s", e)
         # Create output dir with fallback name
         output_dir = make_timestamped_output_dir(output_root)
         return False, "", output_dir
     
     # prepare output folder with concept name
     output_dir = make_timestamped_output_dir(output_root, concept_name)
-    print(f"Outputs will be saved to: {output_dir}")
+    log.info("Outputs will be saved to: %s", output_dir)
+    writer = ArtifactWriter(output_dir)
     
     if save_intermediates:
-        (output_dir / "spec.json").write_text(spec_json, encoding="utf-8")
+        writer.save("spec.json", spec_bytes)
+
+    cache_dir = run_cache_dir(output_root, spec_bytes) if use_run_cache else None
+    if cache_dir is not None:
+        cached_html = load_cached_run(cache_dir, output_dir)
+        if cached_html is not None:
+            log.info("✓ Reused approved output for this spec from %s", cache_dir)
+            await writer.flush()
+            return True, cached_html, output_dir
 
     # 2. Chains presence check
-    print("\n[2/7] Validating provided agents...")
+    log.info("\n[2/7] Validating provided agents...")
     try:
         for name, c in [
             ("planner_chain", planner_chain),
@@ -350,217 +658,285 @@ def generate_simulation_with_checks(
             ("incorporate_feedback_chain", incorporate_feedback_chain),
             ("review_chain", review_chain),
         ]:
-            if not hasattr(c, "invoke"):
-                raise ValueError(f"{name} has no 'invoke' method.")
-        print("✓ All agent objects look callable (have invoke)")
+            if not hasattr(c, "ainvoke"):
+                raise ValueError(f"{name} has no 'ainvoke' method.")
+        log.info("✓ All agent objects look callable (have ainvoke)")
     except Exception as e:
-        print(f"✗ Agent validation failed: {e}")
+        log.warning("✗ Agent validation failed: %s", e)
+        await writer.flush()
         return False, "", output_dir
 
     # 3. PLANNER NODE
-    print("\n[3/7] Planning simulation (Planner Agent)...")
+    log.info("\n[3/7] Planning simulation (Planner Agent)...")
     try:
-        plan_response = planner_chain.invoke({"spec_json": spec_json})
+        plan_response = await _invoke(planner_chain, {"spec_json": spec_json})
         raw_plan_content = getattr(plan_response, "content", str(plan_response))
 
         # Save raw planner response
         if save_intermediates:
-            (output_dir / "1_planner_raw_response.txt").write_text(
-                str(raw_plan_content), encoding="utf-8"
-            )
+            writer.save("1_planner_raw_response.txt", str(raw_plan_content))
 
         parsed = False
         try:
             plan_data = safe_json_parse(raw_plan_content)
             parsed = True
-            plan_json = json.dumps(plan_data, indent=2, ensure_ascii=False)
+            plan_bytes = json_dumps_bytes(plan_data)
+            plan_json = plan_bytes.decode("utf-8")
             if save_intermediates:
-                (output_dir / "1_planner_blueprint.json").write_text(plan_json, encoding="utf-8")
-            print("✓ Blueprint created")
-            print(f"   Objectives: {len(plan_data.get('learning_objectives', []))}")
-            print(f"   Variables: {len(plan_data.get('variables_to_simulate', []))}")
+                writer.save("1_planner_blueprint.json", plan_bytes)
+            log.info("✓ Blueprint created")
+            log.info("   Objectives: %s", len(plan_data.get('learning_objectives', [])))
+            log.info("   Variables: %s", len(plan_data.get('variables_to_simulate', [])))
         except Exception as e_parse:
-            print(f"⚠ Planner parse failed: {e_parse}; attempting retry...")
+            log.warning("⚠ Planner parse failed: %s; attempting retry...", e_parse)
             if save_intermediates:
-                (output_dir / "1_planner_parse_error.txt").write_text(str(e_parse), encoding="utf-8")
+                writer.save("1_planner_parse_error.txt", str(e_parse))
             try:
-                retry_resp = planner_chain.invoke({"spec_json": spec_json})
+                retry_resp = await _invoke(planner_chain, {"spec_json": spec_json})
                 raw_retry = getattr(retry_resp, "content", str(retry_resp))
                 if save_intermediates:
-                    (output_dir / "1_planner_retry_raw_response.txt").write_text(str(raw_retry), encoding="utf-8")
+                    writer.save("1_planner_retry_raw_response.txt", str(raw_retry))
                 plan_data = safe_json_parse(raw_retry)
                 parsed = True
-                plan_json = json.dumps(plan_data, indent=2, ensure_ascii=False)
+                plan_bytes = json_dumps_bytes(plan_data)
+                plan_json = plan_bytes.decode("utf-8")
                 if save_intermediates:
-                    (output_dir / "1_planner_blueprint.json").write_text(plan_json, encoding="utf-8")
-                print("✓ Blueprint created (after retry)")
+                    writer.save("1_planner_blueprint.json", plan_bytes)
+                log.info("✓ Blueprint created (after retry)")
             except Exception as e_retry:
-                print(f"⚠ Using fallback blueprint: {e_retry}")
+                log.warning("⚠ Using fallback blueprint: %s", e_retry)
                 if save_intermediates:
-                    (output_dir / "1_planner_final_error.txt").write_text(str(e_retry), encoding="utf-8")
+                    writer.save("1_planner_final_error.txt", str(e_retry))
                 try:
                     plan_data = generate_default_blueprint_from_spec(spec)
-                    plan_json = json.dumps(plan_data, indent=2, ensure_ascii=False)
+                    plan_bytes = json_dumps_bytes(plan_data)
+                    plan_json = plan_bytes.decode("utf-8")
                     if save_intermediates:
-                        (output_dir / "1_planner_blueprint_fallback.json").write_text(plan_json, encoding="utf-8")
-                    print("✓ Fallback blueprint generated")
+                        writer.save("1_planner_blueprint_fallback.json", plan_bytes)
+                    log.info("✓ Fallback blueprint generated")
                     parsed = True
                 except Exception as e_fb:
-                    print(f"✗ Fallback generation failed: {e_fb}")
+                    log.warning("✗ Fallback generation failed: %s", e_fb)
+                    await writer.flush()
                     return False, "", output_dir
         
         if not parsed:
-            print("✗ Planning failed")
+            log.warning("✗ Planning failed")
+            await writer.flush()
             return False, "", output_dir
     except Exception as e:
-        print(f"✗ Planning invocation failed: {e}")
+        log.warning("✗ Planning invocation failed: %s", e)
+        await writer.flush()
         return False, "", output_dir
 
     # 4. CREATOR NODE
-    print("\n[4/7] Creating index.html (Creator Agent)...")
+    # Student interaction only needs spec + plan, so it runs in the background
+    # across both the creator and bugfix stages and is collected at step 6.
+    log.info("\n[4/7] Creating index.html (Creator Agent), student questions in background...")
+    interaction_task = asyncio.ensure_future(
+        _invoke(student_interaction_chain, {"spec_json": spec_json, "plan": plan_json})
+    )
     try:
-        creation_response = creation_chain.invoke({
-            "spec_json": spec_json, 
-            "plan": plan_json
-        })
-        
+        # raw response is streamed straight into the archive for debugging
+        tee = writer.open_text("2_creator_raw_response.txt") if save_intermediates else nullcontext()
+        with tee as sink:
+            creation_response = await stream_response(
+                creation_chain, {"spec_json": spec_json, "plan": plan_json}, "Creator", tee=sink,
+            )
         raw_content = getattr(creation_response, "content", str(creation_response))
         
-        # Save raw response for debugging
-        if save_intermediates:
-            (output_dir / "2_creator_raw_response.txt").write_text(str(raw_content), encoding="utf-8")
-        
         # Extract HTML from response
         html = extract_html_from_response(raw_content)
         
         # Save the extracted HTML
         if save_intermediates:
-            (output_dir / "2_creator_output.html").write_text(html, encoding="utf-8")
+            writer.save("2_creator_output.html", html)
 
         issues = check_minimum_requirements(html)
         if issues:
-            print("⚠ Initial issues:")
+            log.warning("⚠ Initial issues:")
             for issue in issues:
-                print(f"   - {issue}")
+                log.warning("   - %s", issue)
         else:
-            print("✓ Basic validation passed")
+            log.info("✓ Basic validation passed")
             
     except Exception as e:
-        print(f"✗ Creation failed: {e}")
+        interaction_task.cancel()
+        log.warning("✗ Creation failed: %s", e)
         if save_intermediates:
-            (output_dir / "2_creator_error.txt").write_text(str(e), encoding="utf-8")
+            writer.save("2_creator_error.txt", str(e))
+        await writer.flush()
         return False, "", output_dir
 
     # 5. BUGFIX NODE
-    print("\n[5/7] Fixing issues (Bugfix Agent)...")
-    try:
-        bugfix_response = bugfix_chain.invoke({"html": html})
-        raw_bugfix = getattr(bugfix_response, "content", str(bugfix_response))
-        
-        # Save raw bugfix response
+    log.info("\n[5/7] Fixing issues (Bugfix Agent)...")
+    if set(issues) <= AUTO_FIXABLE_ISSUES:
+        # nothing the LLM needs to fix; doctype/viewport are patched locally
+        html = enforce_minimum_requirements(html)
         if save_intermediates:
-            (output_dir / "3_bugfix_raw_response.txt").write_text(str(raw_bugfix), encoding="utf-8")
-        
+            writer.save("3_bugfix_output.html", html)
+        log.info("✓ No fixes needed, skipping bugfix agent")
+    else:
         try:
-            bugfix_data = safe_json_parse(raw_bugfix)
-            if "index.html" in bugfix_data:
-                html = bugfix_data["index.html"]
-            explanations = bugfix_data.get("explanations", [])
-            if explanations:
-                print(f"✓ Fixed {len(explanations)} issues:")
-                for exp in explanations[:3]:
-                    print(f"   - {exp}")
-        except Exception as e_parse:
-            print(f"⚠ Bugfix parse failed, extracting HTML: {e_parse}")
-            html = extract_html_from_response(raw_bugfix)
+            tee = writer.open_text("3_bugfix_raw_response.txt") if save_intermediates else nullcontext()
+            with tee as sink:
+                bugfix_response = await stream_response(
+                    bugfix_chain, {"html": html}, "Bugfix", tee=sink,
+                )
+            raw_bugfix = getattr(bugfix_response, "content", str(bugfix_response))
         
-        # Enforce minimum requirements
-        html = enforce_minimum_requirements(html)
+            try:
+                bugfix_data = safe_json_parse(raw_bugfix)
+                if "index.html" in bugfix_data:
+                    html = bugfix_data["index.html"]
+                explanations = bugfix_data.get("explanations", [])
+                if explanations:
+                    log.info("✓ Fixed %s issues:", len(explanations))
+                    for exp in explanations[:3]:
+                        log.info("   - %s", exp)
+            except Exception as e_parse:
+                log.warning("⚠ Bugfix parse failed, extracting HTML: %s", e_parse)
+                html = extract_html_from_response(raw_bugfix)
         
-        if save_intermediates:
-            (output_dir / "3_bugfix_output.html").write_text(html, encoding="utf-8")
+            # Enforce minimum requirements
+            html = enforce_minimum_requirements(html)
         
-        print("✓ Bugfix complete")
+            if save_intermediates:
+                writer.save("3_bugfix_output.html", html)
+        
+            log.info("✓ Bugfix complete")
             
-    except Exception as e:
-        print(f"⚠ Bugfix error: {e}")
-        if save_intermediates:
-            (output_dir / "3_bugfix_error.txt").write_text(str(e), encoding="utf-8")
+        except Exception as e:
+            log.warning("⚠ Bugfix error: %s", e)
+            if save_intermediates:
+                writer.save("3_bugfix_error.txt", str(e))
 
     # 6. STUDENT INTERACTION NODE  
-    print("\n[6/7] Generating student questions (Student Interaction Agent)...")
+    log.info("\n[6/7] Student questions (Student Interaction Agent)...")
     try:
-        interaction_response = student_interaction_chain.invoke({
-            "spec_json": spec_json,
-            "plan": plan_json
-        })
+        interaction_response = await interaction_task
         interaction_data = safe_json_parse(interaction_response.content)
         
         if save_intermediates:
-            (output_dir / "4_student_interaction.json").write_text(
-                json.dumps(interaction_data, indent=2), 
-                encoding="utf-8"
-            )
+            writer.save("4_student_interaction.json", json_dumps_bytes(interaction_data))
         
-        print(f"✓ Generated {len(interaction_data.get('questions', []))} questions")
+        log.info("✓ Generated %s questions", len(interaction_data.get('questions', [])))
         
     except Exception as e:
-        print(f"⚠ Interaction generation error: {e}")
+        log.warning("⚠ Interaction generation error: %s", e)
         if save_intermediates:
-            (output_dir / "4_interaction_error.txt").write_text(str(e), encoding="utf-8")
+            writer.save("4_interaction_error.txt", str(e))
 
     # 7. REVIEW NODE
-    print("\n[7/7] REVIEW (Review Agent)")
+    log.info("\n[7/7] REVIEW (Review Agent)")
     try:
-        review_response = review_chain.invoke({"html": html})
-        review_data = safe_json_parse(review_response.content)
+        review_data = static_review(html)
+        if review_data is not None:
+            log.warning("✗ Static checks failed, skipping review agent")
+        else:
+            review_response = await _invoke(review_chain, {"html": html})
+            review_data = safe_json_parse(review_response.content)
 
         if save_intermediates:
-            (output_dir / "6_review_results.json").write_text(
-                json.dumps(review_data, indent=2), encoding="utf-8"
-            )
+            writer.save("6_review_results.json", json_dumps_bytes(review_data))
 
         scores = review_data.get("scores", {})
         passed = review_data.get("pass", False)
         required_changes = review_data.get("required_changes", [])
         
-        print(f"\nScores:")
+        log.info("\nScores:")
         for criterion, score in scores.items():
             status = "✓" if score >= 3 else "✗"
-            print(f"  {status} {criterion}: {score}/5")
+            log.info("  %s %s: %s/5", status, criterion, score)
         
         avg_score = sum(scores.values()) / len(scores) if scores else 0
-        print(f"\nAverage Score: {avg_score:.2f}/5.0")
-        print(f"Status: {'✅ APPROVED' if passed else '❌ NEEDS REVISION'}")
+        log.info("\nAverage Score: %.2f/5.0", avg_score)
+        log.info("Status: %s", '✅ APPROVED' if passed else '❌ NEEDS REVISION')
         
         if not passed and required_changes:
-            print("Required changes:")
+            log.info("Required changes:")
             for change in required_changes[:5]:
-                print(f"  - {change}")
+                log.info("  - %s", change)
         
     except Exception as e:
-        print(f"⚠ Review failed: {e}")
+        log.warning("⚠ Review failed: %s", e)
         if save_intermediates:
-            (output_dir / "6_review_error.txt").write_text(str(e), encoding="utf-8")
+            writer.save("6_review_error.txt", str(e))
         passed = False
+        avg_score = None
+
+    # 8. ROUTE BY REVIEW SCORE
+    if avg_score is not None and not passed and avg_score < 4.5:
+        if avg_score >= 3.0:
+            log.info("\n[+] FEEDBACK (Feedback Agent)")
+            try:
+                feedback_response = await _invoke(incorporate_feedback_chain, {
+                    "html": html,
+                    "feedback_text": "\n".join(required_changes),
+                })
+                if save_intermediates:
+                    writer.save("7_feedback_raw_response.txt", feedback_response.content)
+                feedback_html = extract_html_from_response(feedback_response.content)
+                # the revision is not reviewed again, so it must at least not
+                # regress on the structural checks (e.g. a truncated fragment)
+                if not feedback_html:
+                    log.warning("⚠ Feedback agent returned no HTML, keeping reviewed version")
+                elif len(check_minimum_requirements(feedback_html)) > len(check_minimum_requirements(html)):
+                    log.warning("⚠ Feedback HTML fails more checks, keeping reviewed version")
+                else:
+                    html = feedback_html
+                    log.info("✓ Review feedback applied")
+            except Exception as e:
+                log.warning("⚠ Feedback failed: %s", e)
+        elif avg_score < 3.0 and replan:
+            log.warning("\n✗ Review score too low, restarting from the planner")
+            await writer.flush()
+            retry_spec = dict(spec)
+            retry_spec["Reviewer_Feedback"] = required_changes
+            result = await generate_simulation_with_checks(
+                None,
+                planner_chain,
+                creation_chain,
+                bugfix_chain,
+                student_interaction_chain,
+                incorporate_feedback_chain,
+                review_chain,
+                save_intermediates=save_intermediates,
+                output_root=output_root,
+                spec=retry_spec,
+                use_run_cache=use_run_cache,
+                replan=False,
+            )
+            # also cache the approved replan under the original spec, so the
+            # next run of it skips the failed first pass
+            retry_passed, _, retry_dir = result
+            if cache_dir is not None and retry_passed and (retry_dir / "6_review_results.json").exists():
+                store_cached_run(cache_dir, retry_dir)
+            return result
 
     # Save final output - ensure it's clean HTML
     final_html = enforce_minimum_requirements(html)
-    (output_dir / "5_final_output.html").write_text(final_html, encoding="utf-8")
+    writer.save("5_final_output.html", final_html)
     
-    print("\n" + "=" * 70)
-    print("GENERATION COMPLETE")
-    print("=" * 70)
-    print(f"All outputs saved to: {output_dir}")
-    print(f"Primary output file: {output_dir / '5_final_output.html'}")
-    print(f"File size: {len(final_html)} bytes")
+    log.info("\n" + "=" * 70)
+    log.info("GENERATION COMPLETE")
+    log.info("=" * 70)
+    log.info("All outputs saved to: %s", output_dir)
+    log.info("Primary output file: %s", output_dir / '5_final_output.html')
+    log.info("File size: %s bytes", len(final_html))
     
     final_issues = check_minimum_requirements(final_html)
     if final_issues:
-        print(f"\n⚠ {len(final_issues)} validation issues remaining:")
+        log.warning("\n⚠ %s validation issues remaining:", len(final_issues))
         for issue in final_issues:
-            print(f"   - {issue}")
+            log.warning("   - %s", issue)
     else:
-        print("\n✓ All validation checks passed")
-    
+        log.info("\n✓ All validation checks passed")
+
+    await writer.flush()
+
+    # only approved runs are cached, so a failed spec is retried next time
+    if cache_dir is not None and passed and (output_dir / "6_review_results.json").exists():
+        store_cached_run(cache_dir, output_dir)
+
     return passed, final_html, output_dir
\ No newline at end of file
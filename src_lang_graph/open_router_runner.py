@@ -2,62 +2,70 @@
 """
 CLI wrapper that:
 - Loads environment variables
-- Builds the LLM agents (using ChatPromptTemplate + ChatGoogleGenerativeAI)
+- Builds the LLM agents (using ChatPromptTemplate + ChatOpenAI via OpenRouter)
 - Parses CLI args, creates timestamped output folder and calls the orchestrator
 """
 
 import os
+import asyncio
 import argparse
+from functools import lru_cache
 from pathlib import Path
-from dotenv import load_dotenv
 
-# imports for langchain-style chains
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+# langchain, httpx and the LangGraph orchestrator are imported where they are
+# first used, so `--help` and a bad --spec exit without paying for them.
 
-# orchestrator import
-from sim_generator import generate_simulation
+BASE_URL = "https://openrouter.ai/api/v1"
+MODEL = "kwaipilot/kat-coder-pro:free"
+JSON_MODE = {"type": "json_object"}
 
-load_dotenv()  # load .env
+# Calls in flight to OpenRouter across every spec in the process. Retries of a
+# 429/5xx happen inside the slot (openai's exponential backoff with jitter), so
+# a burst from --spec-dir drains at this rate instead of retrying in lockstep.
+SEM = asyncio.Semaphore(int(os.getenv("OPENROUTER_MAX_CONCURRENCY", "8")))
+MAX_RETRIES = 6
 
-def make_chain(prompt_template: str, llm_instance):
-    """Create a chain from prompt template and LLM"""
-    prompt = ChatPromptTemplate.from_template(prompt_template)
-    return prompt | llm_instance
+_HTTP_CLIENT = None
 
 
-def build_chains():
-    """Build the three agent chains"""
-    
-    base_url = "https://openrouter.ai/api/v1"
+@lru_cache(maxsize=1)
+def get_api_key() -> str:
+    """OPENROUTER_API_KEY, resolved once per process; KeyError when unset."""
+    return os.environ["OPENROUTER_API_KEY"]
 
-    planner_llm = ChatOpenAI(
-        model="kwaipilot/kat-coder-pro:free",
-        temperature=0,
-        api_key=os.getenv("OPENROUTER_API_KEY"),
-        base_url=base_url
-    )
 
-    creator_llm = ChatOpenAI(
-        model="kwaipilot/kat-coder-pro:free",
-        temperature=0,
-        api_key=os.getenv("OPENROUTER_API_KEY"),
-        base_url=base_url
-    )
 
-    reviewer_llm = ChatOpenAI(
-        model="kwaipilot/kat-coder-pro:free",
-        temperature=0,
-        api_key=os.getenv("OPENROUTER_API_KEY"),
-        base_url=base_url
-    )
+def get_http_client():
+    """One pooled async client for every OpenRouter call in the process."""
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None:
+        import httpx
+        try:
+            import h2  # noqa: F401  (HTTP/2 support for httpx)
+            http2 = True
+        except ImportError:
+            http2 = False
+        _HTTP_CLIENT = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+            http2=http2,
+            timeout=60,
+        )
+    return _HTTP_CLIENT
 
 
-    planner_prompt = """
-You are an expert Simulation Planner for CBSE Class 7 students.
+async def close_http_client() -> None:
+    """Close the shared client; cached chains hold it, so they are dropped too."""
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is not None:
+        await _HTTP_CLIENT.aclose()
+        _HTTP_CLIENT = None
+        build_chains.cache_clear()
+
 
-Input spec.json:
-{spec_json}
+# ---------- Prompts ----------
+
+PLANNER_PROMPT = """
+You are an expert Simulation Planner for CBSE Class 7 students.
 
 Create a detailed, pedagogically sound blueprint that prioritizes VISUAL LEARNING over text.
 
@@ -134,23 +142,17 @@ OUTPUT STRUCTURE (MUST BE VALID JSON ONLY):
 }}
 
 CRITICAL OUTPUT RULES:
-- Output ONLY the JSON object above
-- NO markdown code blocks (```), NO extra text
 - ALL fields must be present
-- Ensure valid JSON syntax (proper quotes, commas, brackets)
 """
 
-    creator_prompt = """
-You are an expert HTML Simulation Generator specializing in visual, interactive educational content.
-
-INPUTS:
-
-1) DEVELOPMENT PLAN (verbatim planner output):
-{development_plan}
+PLANNER_INPUT = """Input spec.json:
+{spec_json}"""
 
-2) STRUCTURED BLUEPRINT (authoritative JSON):
-{blueprint}
+CREATOR_PROMPT = """
+You are an expert HTML Simulation Generator specializing in visual, interactive educational content.
 
+You receive a DEVELOPMENT PLAN (verbatim planner output) and a STRUCTURED
+BLUEPRINT (authoritative JSON) in the user message.
 
 YOUR MISSION: Create a COMPLETE, SELF-CONTAINED, MOBILE-FIRST HTML simulation that works perfectly on small screens.
 
@@ -349,9 +351,9 @@ MANDATORY HTML STRUCTURE:
 </body>
 </html>
 
-CRITICAL OUTPUT FORMAT:
+OUTPUT FORMAT (JSON):
 {{
-  "index.html": "<!DOCTYPE html>...[COMPLETE HTML AS SINGLE STRING WITH ESCAPED QUOTES]..."
+  "index.html": "<!DOCTYPE html>...[COMPLETE HTML DOCUMENT]..."
 }}
 
 AUTHORITATIVE RULES (MANDATORY):
@@ -380,23 +382,23 @@ Before generating HTML, internally verify:
 - Every simulation_logic step maps to JS code
 
 If any item is missing, STOP and regenerate.
+"""
 
+CREATOR_INPUT = """INPUTS:
 
-OUTPUT RULES:
-- Output ONLY valid JSON with the structure above
-- NO markdown code blocks (```)
-- NO commentary or explanations
-- The ENTIRE HTML must be a single string value for "index.html"
-- Escape all quotes inside the HTML: use \" for quotes inside the string
-- No newlines in the JSON (they can be in the HTML string with \\n)
-"""
+1) DEVELOPMENT PLAN (verbatim planner output):
+{development_plan}
 
-    reviewer_prompt = """
+2) STRUCTURED BLUEPRINT (authoritative JSON):
+{blueprint}
+
+3) REVIEWER FEEDBACK (required changes from the last review; fix every item):
+{feedback}"""
+
+REVIEWER_PROMPT = """
 You are a Quality Assurance Specialist for educational simulations.
 
-INPUTS:
-HTML Simulation: {html}
-Blueprint (Plan): {plan}
+You receive the HTML simulation and its blueprint (plan) in the user message.
 
 Your task: Review the simulation against the blueprint and quality standards.
 
@@ -472,28 +474,170 @@ OUTPUT FORMAT:
 }}
 
 RULES:
-- Output ONLY valid JSON
-- NO markdown code blocks
 - Be strict about blueprint compliance
 - Provide actionable feedback
 """
 
+REVIEWER_INPUT = """INPUTS:
+HTML Simulation: {html}
+Blueprint (Plan): {plan}
+Structural checks (already verified by a parser, do not re-derive): {structural_checks}"""
+
+
+class LimitedChain:
+    """Runs a chain under the process-wide OpenRouter concurrency limit (SEM)."""
+
+    def __init__(self, chain):
+        self.chain = chain
+
+    async def ainvoke(self, inputs: dict):
+        async with SEM:
+            return await self.chain.ainvoke(inputs)
+
+    async def astream(self, inputs: dict):
+        async with SEM:
+            async for chunk in self.chain.astream(inputs):
+                yield chunk
+
+
+@lru_cache(maxsize=None)
+def compile_prompt(system_template: str, human_template: str, cache_control: bool = False):
+    """
+    Parse a prompt pair into a ChatPromptTemplate, once per process. The static
+    instructions are a fixed system message and only the per-run inputs go in
+    the user message, so the long prefix is identical across calls and eligible
+    for provider-side prompt caching (marked explicitly with `cache_control`,
+    which Anthropic models need).
+    """
+    from langchain_core.messages import SystemMessage
+    from langchain_core.prompts import ChatPromptTemplate
+
+    system_text = system_template.format()  # no variables; resolves {{ }} escapes
+    if cache_control:
+        system = SystemMessage(content=[
+            {"type": "text", "text": system_text, "cache_control": {"type": "ephemeral"}}
+        ])
+    else:
+        system = SystemMessage(content=system_text)
+    return ChatPromptTemplate.from_messages([system, ("user", human_template)])
+
+
+def make_chain(prompt, llm_instance):
+    """
+    Create a chain from a compiled prompt template and LLM. Every agent replies
+    with one JSON object, so JSON mode is requested and the provider guarantees
+    a parseable reply instead of the prompt pleading for escaping.
+    """
+    return LimitedChain(prompt | llm_instance.bind(response_format=JSON_MODE))
+
+
+@lru_cache(maxsize=1)
+def build_chains():
+    """Build the three agent chains (once per process)"""
+    from langchain_openai import ChatOpenAI
+
+    # The three agents share one configuration, so they share one client (and
+    # with it the pooled HTTP/2 connection to OpenRouter).
+    llm = ChatOpenAI(
+        model=MODEL,
+        temperature=0,
+        api_key=get_api_key(),
+        base_url=BASE_URL,
+        http_async_client=get_http_client(),
+        max_retries=MAX_RETRIES,
+        timeout=60,
+    )
+
     # Create chains
-    planner_chain = make_chain(planner_prompt, planner_llm)
-    creator_chain = make_chain(creator_prompt, creator_llm)
-    reviewer_chain = make_chain(reviewer_prompt, reviewer_llm)
+    cache_control = llm.model_name.startswith("anthropic/")
+    planner_chain = make_chain(compile_prompt(PLANNER_PROMPT, PLANNER_INPUT, cache_control), llm)
+    creator_chain = make_chain(compile_prompt(CREATOR_PROMPT, CREATOR_INPUT, cache_control), llm)
+    reviewer_chain = make_chain(compile_prompt(REVIEWER_PROMPT, REVIEWER_INPUT, cache_control), llm)
 
     # Return chains and prompt strings for export
     prompts = {
-        "planner": planner_prompt,
-        "creator": creator_prompt,
-        "reviewer": reviewer_prompt
+        "planner": PLANNER_PROMPT,
+        "creator": CREATOR_PROMPT,
+        "reviewer": REVIEWER_PROMPT
     }
     
     return planner_chain, creator_chain, reviewer_chain, prompts
 
 
-def main():
+class PlannedChain:
+    """Returns a planner reply fetched ahead of time (batch mode), else calls the planner."""
+
+    def __init__(self, content, fallback):
+        self.content = content
+        self.fallback = fallback
+
+    async def ainvoke(self, inputs: dict):
+        if self.content is None:
+            return await self.fallback.ainvoke(inputs)
+        from langchain_core.messages import AIMessage
+        return AIMessage(content=self.content)
+
+
+async def batch_plan(spec_jsons: list, poll_seconds: float = 30) -> list:
+    """
+    Submit every planner prompt as one OpenAI-style Batch API job (files +
+    batches) and poll until it finishes. Returns one reply per spec, or Nones
+    when the provider does not support batches, so callers fall back to
+    direct planner calls.
+    """
+    import openai
+    from langchain_core.messages import convert_to_openai_messages
+    from sim_generator import json_dumps, json_loads
+
+    prompt = compile_prompt(PLANNER_PROMPT, PLANNER_INPUT, MODEL.startswith("anthropic/"))
+    lines = []
+    for i, spec_json in enumerate(spec_jsons):
+        if spec_json is None:  # unreadable spec; generate_simulation reports it
+            continue
+        lines.append(json_dumps({
+            "custom_id": f"spec-{i}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": MODEL,
+                "temperature": 0,
+                "messages": convert_to_openai_messages(prompt.format_messages(spec_json=spec_json)),
+                "response_format": JSON_MODE,
+            },
+        }, pretty=False))
+
+    client = openai.AsyncOpenAI(
+        base_url=BASE_URL, api_key=get_api_key(), http_client=get_http_client()
+    )
+    try:
+        batch_file = await client.files.create(
+            file=("planner.jsonl", ("\n".join(lines) + "\n").encode("utf-8")),
+            purpose="batch",
+        )
+        batch = await client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(poll_seconds)
+            batch = await client.batches.retrieve(batch.id)
+        if batch.status != "completed" or not batch.output_file_id:
+            raise RuntimeError(f"batch {batch.id} ended with status {batch.status}")
+
+        replies = [None] * len(spec_jsons)
+        output = await client.files.content(batch.output_file_id)
+        for line in output.text.splitlines():
+            result = json_loads(line)
+            index = int(result["custom_id"].split("-", 1)[1])
+            replies[index] = result["response"]["body"]["choices"][0]["message"]["content"]
+        return replies
+    except (openai.APIError, RuntimeError, KeyError, ValueError) as e:
+        print(f"⚠ Batch planning unavailable ({e}); calling the planner directly")
+        return [None] * len(spec_jsons)
+
+
+async def amain():
     parser = argparse.ArgumentParser(
         description="Generate CBSE Class 7 simulation using LangGraph"
     )
@@ -513,41 +657,125 @@ def main():
         "--max-iterations",
         type=int,
         default=1,
-        help="Maximum revision iterations"
+        help="Maximum revision iterations (1-5)"
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse node replies for identical inputs (stored in SIM_CACHE_DIR)"
+    )
+    parser.add_argument(
+        "--speculative",
+        action="store_true",
+        help="Start a creator draft from the spec while the planner runs; kept only "
+             "if it covers the final plan (saves a round-trip, may cost an extra call)"
+    )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Generate --max-iterations HTML candidates concurrently and keep the "
+             "best-reviewed one, instead of revising one at a time"
+    )
+    parser.add_argument(
+        "--spec-dir",
+        type=str,
+        default=None,
+        help="Generate every *.json spec in this directory concurrently (overrides --spec)"
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Plan all specs in one Batch API job (discounted, may take hours; "
+             "falls back to direct calls if the provider has no batch support)"
     )
     args = parser.parse_args()
-
-    # Validate spec exists
-    if not Path(args.spec).exists():
-        print(f"❌ Spec not found: {args.spec}")
+    if not 1 <= args.max_iterations <= 5:
+        parser.error("--max-iterations must be between 1 and 5")
+
+    # Read each spec once; the parsed dict and its text go straight to the graph
+    if args.spec_dir:
+        spec_paths = sorted(Path(args.spec_dir).glob("*.json"))
+        if not spec_paths:
+            print(f"❌ No spec files in: {args.spec_dir}")
+            return
+    else:
+        spec_paths = [Path(args.spec)]
+    spec_bytes = []
+    for path in spec_paths:
+        try:
+            spec_bytes.append(path.read_bytes())
+        except FileNotFoundError:
+            print(f"❌ Spec not found: {path}")
+            return
+
+    # Fail before any network call rather than on the first request's 401
+    try:
+        get_api_key()
+    except KeyError:
+        print("❌ OPENROUTER_API_KEY is not set (export it or add it to .env)")
         return
 
+    from sim_generator import generate_simulation, json_loads
+
+    specs = []
+    for raw in spec_bytes:
+        try:
+            specs.append((json_loads(raw), raw.decode("utf-8")))
+        except ValueError:
+            specs.append((None, None))  # generate_simulation reports the bad spec
+
     print("Initializing LLM agents...")
     planner_chain, creator_chain, reviewer_chain, prompts = build_chains()
     print("✓ Agents ready\n")
 
-    # Run generation
-    approved, html, output_folder = generate_simulation(
-        spec_path=args.spec,
-        planner_chain=planner_chain,
-        creator_chain=creator_chain,
-        reviewer_chain=reviewer_chain,
-        output_root=args.output_root,
-        max_iterations=args.max_iterations,
-        prompts=prompts  # Pass prompts for export
-    )
+    # Run generation (one graph run per spec, all on this event loop)
+    try:
+        planner_chains = [planner_chain] * len(spec_paths)
+        if args.batch:
+            spec_jsons = [spec_json for _, spec_json in specs]  # None for a bad spec
+            replies = await batch_plan(spec_jsons, float(os.getenv("BATCH_POLL_SECONDS", "30")))
+            planner_chains = [PlannedChain(reply, planner_chain) for reply in replies]
+
+        results = await asyncio.gather(*(
+            generate_simulation(
+                spec_path=str(path),
+                planner_chain=planner,
+                creator_chain=creator_chain,
+                reviewer_chain=reviewer_chain,
+                output_root=args.output_root,
+                max_iterations=args.max_iterations,
+                prompts=prompts,  # Pass prompts for export
+                speculative=args.speculative,
+                parallel=args.parallel,
+                spec=spec,
+                spec_json=spec_json,
+                use_cache=args.cache
+            )
+            for path, (spec, spec_json), planner in zip(spec_paths, specs, planner_chains)
+        ))
+    finally:
+        await close_http_client()
 
     # Final summary
-    print("\n" + "=" * 70)
-    if approved:
-        print("✅ Simulation APPROVED and ready!")
-    else:
-        print("⚠️  Simulation generated but needs revision")
-    print("=" * 70)
-    print(f"📁 Outputs: {output_folder}")
-    print(f"📄 Main file: {output_folder / '4_final_output.html'}")
+    for path, (approved, html, output_folder) in zip(spec_paths, results):
+        print("\n" + "=" * 70)
+        if len(spec_paths) > 1:
+            print(f"Spec: {path}")
+        if approved:
+            print("✅ Simulation APPROVED and ready!")
+        else:
+            print("⚠️  Simulation generated but needs revision")
+        print("=" * 70)
+        print(f"📁 Outputs: {output_folder}")
+        print(f"📄 Main file: {output_folder / '4_final_output.html'}")
     print(f"\n💡 Open the HTML file in a browser to view the simulation\n")
 
 
+def main():
+    asyncio.run(amain())
+
+
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()  # load .env
     main()
\ No newline at end of file
@@ -5,6 +5,7 @@ Builds 3 LLM chains: Planner, Creator, Reviewer
 """
 
 import os
+import asyncio
 import argparse
 from pathlib import Path
 from dotenv import load_dotenv
@@ -145,6 +146,8 @@ INPUTS:
 2) STRUCTURED BLUEPRINT (authoritative JSON):
 {blueprint}
 
+3) REVIEWER FEEDBACK (required changes from the last review; fix every item):
+{feedback}
 
 YOUR MISSION: Create a COMPLETE, SELF-CONTAINED, MOBILE-FIRST HTML simulation that works perfectly on small screens.
 
@@ -507,9 +510,16 @@ def main():
         "--max-iterations",
         type=int,
         default=1,
-        help="Maximum revision iterations"
+        help="Maximum revision iterations (1-5)"
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse node replies for identical inputs (stored in SIM_CACHE_DIR)"
     )
     args = parser.parse_args()
+    if not 1 <= args.max_iterations <= 5:
+        parser.error("--max-iterations must be between 1 and 5")
 
     # Validate spec exists
     if not Path(args.spec).exists():
@@ -521,15 +531,16 @@ def main():
     print("✓ Agents ready\n")
 
     # Run generation
-    approved, html, output_folder = generate_simulation(
+    approved, html, output_folder = asyncio.run(generate_simulation(
         spec_path=args.spec,
         planner_chain=planner_chain,
         creator_chain=creator_chain,
         reviewer_chain=reviewer_chain,
         output_root=args.output_root,
         max_iterations=args.max_iterations,
-        prompts=prompts  # Pass prompts for export
-    )
+        prompts=prompts,  # Pass prompts for export
+        use_cache=args.cache
+    ))
 
     # Final summary
     print("\n" + "=" * 70)
@@ -1,46 +1,105 @@
 # sim_generator.py
 """
 Simulation generation using LangGraph with 3 nodes: Planner -> Creator -> Reviewer
+Nodes are async and call chains with `ainvoke`, so several runs can share one
+event loop without blocking each other on LLM round-trips.
 """
 
+import asyncio
+import hashlib
 import json
+import os
+import re
+import statistics
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Any, TypedDict
+from typing import Dict, Any, List, Optional, Tuple, Union
 from datetime import datetime
 
-from langgraph.graph import StateGraph, END
-from langchain_core.messages import HumanMessage
+try:
+    import orjson
+except ImportError:  # optional: faster JSON parsing/serialization when installed
+    orjson = None
+
+# langgraph is imported in build_graph, so the JSON/file helpers here can be
+# imported (e.g. by the CLI before it validates its arguments) without it.
 
 
 # ---------- State Definition ----------
 
-class SimulationState(TypedDict):
-    """State that flows through the graph"""
-    spec_json: str
-    concept_name: str
-    planner_raw_output: str        # full planner response
-    planner_blueprint: Dict[str, Any]  # parsed JSON (strict)
-    creator_output: str
-    reviewer_output: Dict[str, Any]
-    output_dir: str
-    iteration: int
-    max_iterations: int
-    approved: bool
+@dataclass(slots=True)
+class SimulationState:
+    """
+    State that flows through the graph. A slotted dataclass: nodes read and set
+    attributes instead of hashing dict keys, and every field has a default.
+    """
+    spec_json: str = ""
+    concept_name: str = ""
+    planner_raw_output: str = ""       # full planner response
+    planner_blueprint: Dict[str, Any] = field(default_factory=dict)  # parsed JSON (strict)
+    planner_blueprint_json: str = ""   # blueprint serialized once for the creator
+    reviewer_plan_json: str = ""       # ...and compact/sorted for the reviewer
+    creator_output: str = ""
+    structural_checks: Dict[str, bool] = field(default_factory=dict)  # cheap facts found while the creator streamed
+    candidates: List[Dict[str, Any]] = field(default_factory=list)  # parallel mode: {"index", "html", "structural_checks"} per draw
+    reviewer_output: Dict[str, Any] = field(default_factory=dict)
+    reviewed_html_hash: str = ""       # blake2b of the HTML the last verdict is for
+    html_unchanged: bool = False       # latest creator output matched that hash
+    output_dir: str = ""
+    iteration: int = 0
+    max_iterations: int = 1
+    approved: bool = False
+    use_cache: bool = False            # reuse node replies from NODE_CACHE_DIR
 
 
 # ---------- Utilities ----------
 
-def load_spec(path: str) -> Dict[str, Any]:
-    """Load spec JSON"""
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+_NON_WORD_RE = re.compile(r'[^\w\s-]')
+_WHITESPACE_RE = re.compile(r'[\s_]+')
+_HTML_START_RE = re.compile(r'<!doctype|<html', re.IGNORECASE)
+_HTML_END_RE = re.compile(r'</html>', re.IGNORECASE)
+_DOCTYPE_RE = re.compile(r'<!doctype\s+html', re.IGNORECASE)
+_VIEWPORT_RE = re.compile(r'<meta\s+name=["\']viewport', re.IGNORECASE)
+_HEAD_OPEN_RE = re.compile(r'<head\b[^>]*>', re.IGNORECASE)
+VIEWPORT_META = '<meta name="viewport" content="width=device-width, initial-scale=1.0">'
+
+
+def json_loads(data: Any) -> Any:
+    """Parse JSON (str or bytes) with orjson when available, else the stdlib."""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def json_dumps(data: Any, pretty: bool = True, sort_keys: bool = False) -> str:
+    """Serialize to a JSON string (orjson when available), indented or compact."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(data, option=option).decode("utf-8")
+    if pretty:
+        return json.dumps(data, indent=2, sort_keys=sort_keys, ensure_ascii=False)
+    return json.dumps(data, separators=(",", ":"), sort_keys=sort_keys, ensure_ascii=False)
+
+
+def _looks_pretty(text: Union[str, bytes]) -> bool:
+    """Whether JSON text (or UTF-8 bytes) is already indented (checked on its first 200 characters)."""
+    return (b"\n  " if isinstance(text, bytes) else "\n  ") in text[:200]
+
+
+def load_spec(path: str) -> Tuple[Dict[str, Any], bytes]:
+    """Load spec JSON; returns the parsed spec and the file's bytes"""
+    data = Path(path).read_bytes()
+    return json_loads(data), data
 
 
 def sanitize_filename(name: str) -> str:
     """Sanitize string for use in filenames"""
-    import re
-    sanitized = re.sub(r'[^\w\s-]', '', name)
-    sanitized = re.sub(r'[\s_]+', '_', sanitized)
+    sanitized = _NON_WORD_RE.sub('', name)
+    sanitized = _WHITESPACE_RE.sub('_', sanitized)
     sanitized = sanitized.strip('_')
     if len(sanitized) > 50:
         sanitized = sanitized[:50]
@@ -49,35 +108,87 @@ def sanitize_filename(name: str) -> str:
 
 def make_timestamped_output_dir(base_dir: str = "output", concept_name: str = None) -> Path:
     """Create timestamped output directory"""
-    now = datetime.now()
-    folder_name = now.strftime("%Y-%m-%d_%H-%M-%S")
+    folder_name = time.strftime("%Y-%m-%d_%H-%M-%S")
     
     if concept_name:
-        sanitized_concept = sanitize_filename(concept_name)
-        folder_name = f"{folder_name}_{sanitized_concept}"
+        folder_name = f"{folder_name}_{sanitize_filename(concept_name)}"
     
-    root = Path(base_dir) / folder_name
-    root.mkdir(parents=True, exist_ok=True)
-    return root
+    os.makedirs(base_dir, exist_ok=True)
+    # Runs started in the same second (e.g. --spec-dir) get _2, _3, ... instead of sharing a folder
+    root = os.path.join(base_dir, folder_name)
+    suffix = 1
+    while True:
+        try:
+            os.mkdir(root)
+            return Path(root)
+        except FileExistsError:
+            suffix += 1
+            root = os.path.join(base_dir, f"{folder_name}_{suffix}")
+
+
+def message_text(message: Any) -> str:
+    """Text of an LLM reply or stream chunk, without str()-ing the whole message when it has `content`."""
+    content = message.content if hasattr(message, "content") else message
+    return content if isinstance(content, str) else str(content)
+
+
+def _find_json_object(text: str) -> Optional[str]:
+    """
+    Return the first balanced {...} block in `text`, or None. One linear pass
+    tracking brace depth; braces inside JSON strings (and escaped quotes) are ignored.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+def _strip_code_fence(text: str) -> str:
+    """
+    Drop a surrounding ``` fence (and its json/html tag) by slicing, without
+    lowercasing or re-stripping the whole, possibly large, reply.
+    """
+    if text[:3] != "```":
+        return text
+    newline = text.find("\n")
+    if newline != -1 and text[3:newline].strip().lower() in ("", "json", "html"):
+        text = text[newline + 1:]
+    else:
+        text = text[3:]
+    end = text.rfind("```")
+    if end != -1:
+        text = text[:end]
+    return text.strip()
 
 
 def safe_json_parse(content: str) -> Dict[str, Any]:
     """Parse JSON from LLM response"""
-    import re
-    
-    text = str(content).strip()
-    
-    # Remove markdown code blocks
-    if text.startswith("```"):
-        text = text.strip("`").strip()
-        if text.lower().startswith("json"):
-            text = text[4:].lstrip()
+    text = _strip_code_fence(str(content).strip())
     
     # Try to find JSON object
-    match = re.search(r'\{(?:[^{}]|(?:\{[^{}]*\}))*\}', text, re.DOTALL)
-    if match:
-        json_str = match.group(0)
-    else:
+    json_str = _find_json_object(text)
+    if json_str is None:
         first_brace = text.find('{')
         last_brace = text.rfind('}')
         if first_brace != -1 and last_brace != -1:
@@ -85,47 +196,220 @@ def safe_json_parse(content: str) -> Dict[str, Any]:
         else:
             raise ValueError("Could not find JSON in response")
     
-    return json.loads(json_str)
+    return json_loads(json_str)
 
 
 def extract_html_from_response(response_content: str) -> str:
     """Extract HTML from LLM response"""
-    text = str(response_content).strip()
+    if not isinstance(response_content, str):
+        response_content = str(response_content)
+    
+    # Already bare HTML (the common non-JSON case): nothing to unwrap
+    if response_content[:32].lstrip().lower().startswith(("<!doctype", "<html")):
+        return response_content.strip()
     
-    # Remove markdown
-    if text.startswith("```"):
-        text = text.strip("`").strip()
-        if text.lower().startswith("html") or text.lower().startswith("json"):
-            text = text[4:].lstrip()
+    text = _strip_code_fence(response_content.strip())
     
     # If already HTML
-    if text.lstrip().lower().startswith("<!doctype") or text.lstrip().lower().startswith("<html"):
+    if text[:9].lower().startswith(("<!doctype", "<html")):
         return text
     
-    # Try JSON parse
-    try:
-        data = json.loads(text)
-        if isinstance(data, dict) and "index.html" in data:
-            return data["index.html"]
-    except json.JSONDecodeError:
-        pass
-    
-    # Find HTML tags
-    lower = text.lower()
-    doctype_start = lower.find("<!doctype")
-    html_start = lower.find("<html")
-    
-    start_pos = doctype_start if doctype_start != -1 else html_start
-    
-    if start_pos != -1:
-        end_pos = lower.rfind("</html>")
+    # Try JSON parse (only worth it when the reply is an object)
+    if text[:1] == "{":
+        try:
+            data = json_loads(text)
+            if isinstance(data, dict) and "index.html" in data:
+                return data["index.html"]
+        except ValueError:  # json and orjson decode errors both subclass it
+            pass
+    
+    # Find HTML tags (case-insensitive searches, no lowercased copy)
+    start = _HTML_START_RE.search(text)
+    
+    if start:
+        # </html> is almost always near the end: look in the tail first and
+        # only scan the whole document when trailing text pushes it further up
+        end_pos = -1
+        for tail_from in (max(start.start(), len(text) - 256), start.start()):
+            for end in _HTML_END_RE.finditer(text, tail_from):
+                end_pos = end.end()
+            if end_pos != -1 or tail_from == start.start():
+                break
         if end_pos != -1:
-            return text[start_pos:end_pos + len("</html>")]
-        return text[start_pos:]
+            return text[start.start():end_pos]
+        return text[start.start():]
     
     return text
 
 
+class StreamingHtmlChecker:
+    """
+    Checks the reviewer's regex-cheap criteria on the creator output while it
+    streams. Each chunk is scanned once, with a short overlap so a marker split
+    across two chunks is still seen. Quotes may be JSON-escaped in the raw reply.
+    """
+
+    CHECKS = {
+        "has_viewport_meta": re.compile(r"name=\\?[\"']viewport", re.IGNORECASE),
+        "has_range_input": re.compile(r"type=\\?[\"']range", re.IGNORECASE),
+        "has_script": re.compile(r"<script", re.IGNORECASE),
+        "has_event_listeners": re.compile(r"addEventListener"),
+    }
+    OVERLAP = 32
+
+    def __init__(self):
+        self.found = {name: False for name in self.CHECKS}
+        self._tail = ""
+
+    def feed(self, text: str) -> None:
+        window = self._tail + text
+        for name, pattern in self.CHECKS.items():
+            if not self.found[name] and pattern.search(window):
+                self.found[name] = True
+        self._tail = window[-self.OVERLAP:]
+
+
+_HTML_COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+_LEADING_SPACE_RE = re.compile(r"^[ \t]+|[ \t]+$", re.MULTILINE)
+_BLANK_LINES_RE = re.compile(r"\n{2,}")
+REVIEWER_MAX_HTML_CHARS = 60000
+
+
+def _prep_reviewer_inputs(html: str, plan_json: str) -> Dict[str, str]:
+    """
+    Shrink the reviewer's inputs: drop HTML comments, indentation and blank
+    lines (line breaks are kept so inline JS still reads correctly) and cap
+    very long documents. `plan_json` is the plan already in compact form.
+    """
+    html = _HTML_COMMENT_RE.sub("", html)
+    html = _LEADING_SPACE_RE.sub("", html)
+    html = _BLANK_LINES_RE.sub("\n", html).strip()
+    if len(html) > REVIEWER_MAX_HTML_CHARS:
+        html = html[:REVIEWER_MAX_HTML_CHARS] + "\n<!-- [truncated for review] -->"
+    return {
+        "html": html,
+        "plan": plan_json,
+    }
+
+
+def stub_blueprint(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Placeholder blueprint for a speculative creator draft, built from the spec alone."""
+    return {
+        "learning_objectives": [spec.get("Description", "")],
+        "key_concepts": [spec.get("Concept", "")],
+        "variables_to_simulate": "Not planned yet: infer at most 3 from the spec",
+        "layout_structure": "header, visual-area, controls, info (single column)",
+    }
+
+
+async def accept_draft(draft: "asyncio.Future", blueprint: Dict[str, Any]) -> Optional[str]:
+    """
+    Return the speculative creator reply if it already names every variable of
+    the real plan, else None so the creator runs against the plan.
+    """
+    try:
+        response = await draft
+    except Exception as e:
+        print(f"⚠ Speculative draft failed: {e}")
+        return None
+
+    raw_content = message_text(response)
+    names = [
+        str(v["name"]) for v in blueprint.get("variables_to_simulate", [])
+        if isinstance(v, dict) and v.get("name")
+    ]
+    lower = raw_content.lower()
+    if names and all(name.lower() in lower for name in names):
+        return raw_content
+    return None
+
+
+def _write_file(path: Path, data: bytes, fsync: bool = False) -> None:
+    """Write bytes with raw os.open/os.write: no buffered file object per artifact."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        if fsync:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """
+    Replace `path` with `data` via a temp file and os.replace, so a crash leaves
+    the old file or the new one, never a partial one.
+    """
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        _write_file(tmp, data, fsync=True)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+async def write_text_async(path: Path, text: str) -> None:
+    """Write a UTF-8 file on a worker thread so the event loop keeps serving LLM calls."""
+    await asyncio.to_thread(_write_file, path, text.encode("utf-8", "surrogatepass"))
+
+
+async def write_final_async(path: Path, text: str) -> None:
+    """write_text_async for deliverables, replacing the file atomically."""
+    await asyncio.to_thread(_write_atomic, path, text.encode("utf-8", "surrogatepass"))
+
+
+# Node artifacts are written in the background while the next LLM call runs;
+# generate_simulation drains a run's writes (and surfaces their errors) at the end.
+_IO_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sim-io")
+_PENDING_WRITES: Dict[Path, Future] = {}  # last queued write per file
+
+
+def write_text_background(path: Path, text: Union[str, bytes]) -> None:
+    """Queue a UTF-8 write (bytes are written as-is); a file rewritten by a later iteration keeps the last content."""
+    previous = _PENDING_WRITES.get(path)
+
+    def write() -> None:
+        if previous is not None:
+            previous.result()
+        # encoded once and written as bytes: no text-layer newline translation
+        _write_file(path, text if isinstance(text, bytes) else text.encode("utf-8", "surrogatepass"))
+
+    _PENDING_WRITES[path] = _IO_POOL.submit(write)
+
+
+async def flush_writes(output_dir: Path) -> None:
+    """Wait for the queued writes under `output_dir`, re-raising the first failure."""
+    pending = [_PENDING_WRITES.pop(path) for path in list(_PENDING_WRITES) if path.parent == output_dir]
+    for future in pending:
+        await asyncio.wrap_future(future)
+
+
+# Replies are cached per node, keyed on the node's inputs only: clear the
+# directory after changing models or prompts.
+NODE_CACHE_DIR = Path(os.getenv("SIM_CACHE_DIR", str(Path.home() / ".cache" / "sim_generator")))
+
+
+def _cache_key(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def _llm_cache_get(node: str, key: str) -> Optional[str]:
+    """Cached reply of `node` for `key`, or None."""
+    try:
+        return (NODE_CACHE_DIR / node / f"{key}.txt").read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+
+
+async def _llm_cache_put(node: str, key: str, content: str) -> None:
+    path = NODE_CACHE_DIR / node / f"{key}.txt"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    await write_text_async(path, content)
+
+
 def export_prompt_to_file(output_dir: Path, node_name: str, prompt: str):
     """Export prompt template to file"""
     prompt_file = output_dir / f"{node_name}_prompt.txt"
@@ -134,193 +418,401 @@ def export_prompt_to_file(output_dir: Path, node_name: str, prompt: str):
 
 # ---------- Node Functions ----------
 
-def planner_node(state: SimulationState, planner_chain) -> SimulationState:
+async def planner_node(state: SimulationState, planner_chain) -> SimulationState:
     """Planner Node - Creates simulation blueprint"""
     print("\n[PLANNER NODE] Creating blueprint...")
     
-    output_dir = Path(state["output_dir"])
+    output_dir = Path(state.output_dir)
     
     try:
-        # Invoke planner
-        response = planner_chain.invoke({"spec_json": state["spec_json"]})
-        raw_content = getattr(response, "content", str(response))
+        key = _cache_key(state.spec_json)
+        raw_content = _llm_cache_get("planner", key) if state.use_cache else None
+        if raw_content is not None:
+            print("✓ Using cached planner reply")
+        else:
+            # Invoke planner
+            response = await planner_chain.ainvoke({"spec_json": state.spec_json})
+            raw_content = message_text(response)
+            if state.use_cache:
+                await _llm_cache_put("planner", key, raw_content)
         
         # Save raw response
-        (output_dir / "1_planner_raw_response.txt").write_text(
-            str(raw_content), encoding="utf-8"
-        )
+        write_text_background(output_dir / "1_planner_raw_response.txt", raw_content)
 
-        state["planner_raw_output"] = str(raw_content)
+        state.planner_raw_output = raw_content
         
-        # Parse JSON
-        plan_data = safe_json_parse(raw_content)
-        plan_json = json.dumps(plan_data, indent=2, ensure_ascii=False)
+        # Parse JSON; a reply that already is indented JSON is saved as-is
+        # rather than parsed and serialized again just to re-indent it
+        try:
+            plan_data = json_loads(raw_content)
+        except ValueError:
+            plan_data = None
+        if isinstance(plan_data, dict):
+            plan_json = raw_content.strip() if _looks_pretty(raw_content) else json_dumps(plan_data)
+        else:
+            plan_data = safe_json_parse(raw_content)
+            plan_json = json_dumps(plan_data)
         
         # Save parsed blueprint
-        (output_dir / "1_planner_blueprint.json").write_text(
-            plan_json, encoding="utf-8"
-        )
+        write_text_background(output_dir / "1_planner_blueprint.json", plan_json)
         
         print(f"✓ Blueprint created")
         print(f"  Learning objectives: {len(plan_data.get('learning_objectives', []))}")
         print(f"  Variables: {len(plan_data.get('variables_to_simulate', []))}")
         
         # FIX: Use correct state key
-        state["planner_blueprint"] = plan_data
+        state.planner_blueprint = plan_data
+        # serialized here once; every creator/reviewer pass reuses the strings
+        state.planner_blueprint_json = plan_json
+        state.reviewer_plan_json = json_dumps(plan_data, pretty=False, sort_keys=True)
         
     except Exception as e:
         print(f"✗ Planner failed: {e}")
-        (output_dir / "1_planner_error.txt").write_text(str(e), encoding="utf-8")
+        write_text_background(output_dir / "1_planner_error.txt", str(e))
         raise
     
     return state
 
 
-def creator_node(state: SimulationState, creator_chain) -> SimulationState:
-    """Creator Node - Generates HTML simulation"""
-    print("\n[CREATOR NODE] Generating HTML simulation...")
+def finalize_html(raw_content: str, checks: Dict[str, bool]) -> str:
+    """Extract the creator's HTML and ensure DOCTYPE and viewport meta (updating `checks`)."""
+    html = extract_html_from_response(raw_content)
     
-    output_dir = Path(state["output_dir"])
+    if not _DOCTYPE_RE.search(html):
+        html = "<!DOCTYPE html>\n" + html
     
-    try:
-        # FIX: Use correct state key
-        blueprint_json = json.dumps(
-            state["planner_blueprint"],
-            indent=2,
-            ensure_ascii=False
+    if not _VIEWPORT_RE.search(html):
+        html, injected = _HEAD_OPEN_RE.subn(
+            lambda m: m.group(0) + "\n    " + VIEWPORT_META, html, count=1
         )
+        if injected:
+            checks["has_viewport_meta"] = True
+    return html
 
-        response = creator_chain.invoke({
-            "spec_json": state["spec_json"],
-            "blueprint": blueprint_json,
-            "development_plan": state["planner_raw_output"]
-        })
 
-        
-        raw_content = getattr(response, "content", str(response))
-        
-        # Save raw response
-        (output_dir / "2_creator_raw_response.txt").write_text(
-            str(raw_content), encoding="utf-8"
-        )
-        
-        # Extract HTML
-        html = extract_html_from_response(raw_content)
-        
-        # Ensure basic requirements
-        if "<!DOCTYPE html>" not in html and "<!doctype html>" not in html:
-            html = "<!DOCTYPE html>\n" + html
-        
-        if '<meta name="viewport"' not in html.lower():
-            if "<head>" in html.lower():
-                html = html.replace("<head>", '<head>\n    <meta name="viewport" content="width=device-width, initial-scale=1.0">', 1)
+NO_FEEDBACK = "None (first draft)."
+
+
+def _prep_creator_inputs(state: SimulationState) -> Dict[str, str]:
+    """Creator inputs; after a failed review they carry its required changes."""
+    changes = state.reviewer_output.get("required_changes") if state.iteration else None
+    return {
+        "spec_json": state.spec_json,
+        "blueprint": state.planner_blueprint_json,
+        "development_plan": state.planner_raw_output,
+        "feedback": "\n".join(f"- {change}" for change in changes) if changes else NO_FEEDBACK,
+    }
+
+
+async def creator_node(state: SimulationState, creator_chain, draft=None) -> SimulationState:
+    """
+    Creator Node - Generates HTML simulation. On the first pass a speculative
+    `draft` (started alongside the planner) is used when it covers the plan.
+    """
+    print("\n[CREATOR NODE] Generating HTML simulation...")
+    
+    output_dir = Path(state.output_dir)
+    
+    try:
+        inputs = _prep_creator_inputs(state)
+        checker = StreamingHtmlChecker()
+
+        key = _cache_key(*inputs.values())
+        cached = _llm_cache_get("creator", key) if state.use_cache else None
+        raw_content = None
+        if draft is not None and state.iteration == 0:
+            raw_content = await accept_draft(draft, state.planner_blueprint)
+        from_draft = raw_content is not None  # built from the stub plan: never cached
+        # Check the raw response as it streams; it is saved once complete
+        if raw_content is not None or cached is not None:
+            if raw_content is not None:
+                print("✓ Speculative draft covers the plan, skipping the creator call")
+            else:
+                print("✓ Using cached creator reply")
+                raw_content = cached
+            checker.feed(raw_content)
+        elif hasattr(creator_chain, "astream"):
+            parts = []
+            async for chunk in creator_chain.astream(inputs):
+                text = message_text(chunk)
+                parts.append(text)
+                checker.feed(text)
+            raw_content = "".join(parts)
+        else:
+            response = await creator_chain.ainvoke(inputs)
+            raw_content = message_text(response)
+            checker.feed(raw_content)
+        write_text_background(output_dir / "2_creator_raw_response.txt", raw_content)
+        if state.use_cache and cached is None and not from_draft:
+            await _llm_cache_put("creator", key, raw_content)
+
+        html = finalize_html(raw_content, checker.found)
         
         # Save HTML
-        (output_dir / "2_creator_output.html").write_text(html, encoding="utf-8")
+        write_text_background(output_dir / "2_creator_output.html", html)
         
         print(f"✓ HTML generated ({len(html)} bytes)")
         
-        state["creator_output"] = html
+        state.creator_output = html
+        state.structural_checks = checker.found
         
     except Exception as e:
         print(f"✗ Creator failed: {e}")
-        (output_dir / "2_creator_error.txt").write_text(str(e), encoding="utf-8")
+        write_text_background(output_dir / "2_creator_error.txt", str(e))
         raise
     
     return state
 
 
-def reviewer_node(state: SimulationState, reviewer_chain) -> SimulationState:
+async def review_reply(state: SimulationState, html: str, checks: Dict[str, bool], reviewer_chain) -> str:
+    """Raw reviewer reply for `html` (from the node cache when enabled)."""
+    inputs = {
+        **_prep_reviewer_inputs(html, state.reviewer_plan_json),
+        "structural_checks": json_dumps(checks, pretty=False)
+    }
+    key = _cache_key(*inputs.values())
+    raw_content = _llm_cache_get("reviewer", key) if state.use_cache else None
+    if raw_content is not None:
+        print("✓ Using cached reviewer reply")
+        return raw_content
+    raw_content = message_text(await reviewer_chain.ainvoke(inputs))
+    if state.use_cache:
+        await _llm_cache_put("reviewer", key, raw_content)
+    return raw_content
+
+
+async def reviewer_node(state: SimulationState, reviewer_chain) -> SimulationState:
     """Reviewer Node - Reviews simulation against blueprint"""
     print("\n[REVIEWER NODE] Reviewing simulation...")
     
-    output_dir = Path(state["output_dir"])
-    
+    output_dir = Path(state.output_dir)
+    state.iteration += 1
+
+    # A regeneration identical to the last reviewed HTML cannot score
+    # differently, so keep that verdict instead of paying for another review
+    html_hash = hashlib.blake2b(state.creator_output.encode("utf-8"), digest_size=16).hexdigest()
+    state.html_unchanged = html_hash == state.reviewed_html_hash
+    if state.html_unchanged:
+        print("✓ HTML unchanged since last review, reusing its verdict")
+        return state
+    state.reviewed_html_hash = html_hash
+
     try:
         # FIX: Use correct state key
-        response = reviewer_chain.invoke({
-            "html": state["creator_output"],
-            "plan": json.dumps(state["planner_blueprint"], indent=2, ensure_ascii=False)
-        })
-        
-        raw_content = getattr(response, "content", str(response))
+        raw_content = await review_reply(
+            state, state.creator_output, state.structural_checks, reviewer_chain
+        )
         
         # Save raw response
-        (output_dir / "3_reviewer_raw_response.txt").write_text(
-            str(raw_content), encoding="utf-8"
-        )
+        write_text_background(output_dir / "3_reviewer_raw_response.txt", raw_content)
         
         # Parse review
         review_data = safe_json_parse(raw_content)
         
         # Save review results
-        (output_dir / "3_reviewer_results.json").write_text(
-            json.dumps(review_data, indent=2, ensure_ascii=False),
-            encoding="utf-8"
-        )
+        write_text_background(output_dir / "3_reviewer_results.json", json_dumps(review_data))
         
-        # Display scores
+        # Display scores (one print, so concurrent runs don't interleave lines)
         scores = review_data.get("scores", {})
         passed = review_data.get("pass", False)
         
-        print(f"\n  Scores:")
-        for criterion, score in scores.items():
-            status = "✓" if score >= 3 else "✗"
-            print(f"    {status} {criterion}: {score}/5")
+        lines = ["\n  Scores:"]
+        lines += [f"    {'✓' if score >= 3 else '✗'} {criterion}: {score}/5" for criterion, score in scores.items()]
         
-        avg_score = sum(scores.values()) / len(scores) if scores else 0
-        print(f"\n  Average: {avg_score:.2f}/5.0")
-        print(f"  Status: {'✅ APPROVED' if passed else '❌ NEEDS REVISION'}")
+        avg_score = statistics.fmean(scores.values()) if scores else 0.0
+        lines.append(f"\n  Average: {avg_score:.2f}/5.0")
+        lines.append(f"  Status: {'✅ APPROVED' if passed else '❌ NEEDS REVISION'}")
         
         if not passed:
             changes = review_data.get("required_changes", [])
             if changes:
-                print(f"\n  Required changes:")
-                for change in changes[:3]:
-                    print(f"    - {change}")
+                lines.append("\n  Required changes:")
+                lines += [f"    - {change}" for change in changes[:3]]
+        print("\n".join(lines))
         
-        state["reviewer_output"] = review_data
-        state["approved"] = passed
-        state["iteration"] = state.get("iteration", 0) + 1
+        state.reviewer_output = review_data
+        state.approved = passed
         
     except Exception as e:
         print(f"✗ Reviewer failed: {e}")
-        (output_dir / "3_reviewer_error.txt").write_text(str(e), encoding="utf-8")
-        state["approved"] = False
+        write_text_background(output_dir / "3_reviewer_error.txt", str(e))
+        state.approved = False
     
     return state
 
 
+async def parallel_creator_node(state: SimulationState, creator_chain, draft=None) -> SimulationState:
+    """
+    Parallel Creator Node - Draws `max_iterations` candidates at once instead of
+    regenerating one at a time; select_best_node keeps the best-reviewed one.
+    """
+    count = max(1, state.max_iterations)
+    print(f"\n[PARALLEL CREATOR NODE] Generating {count} HTML candidates...")
+    
+    output_dir = Path(state.output_dir)
+    
+    try:
+        inputs = _prep_creator_inputs(state)
+        replies = []
+        if draft is not None:
+            accepted = await accept_draft(draft, state.planner_blueprint)
+            if accepted is not None:
+                print("✓ Speculative draft covers the plan, using it as a candidate")
+                replies.append(accepted)
+        
+        results = await asyncio.gather(
+            *(creator_chain.ainvoke(inputs) for _ in range(count - len(replies))),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"⚠ Creator candidate failed: {result}")
+            else:
+                replies.append(message_text(result))
+        if not replies:
+            raise RuntimeError("every creator candidate failed")
+        
+        candidates = []
+        for i, raw_content in enumerate(replies, 1):
+            checker = StreamingHtmlChecker()
+            checker.feed(raw_content)
+            html = finalize_html(raw_content, checker.found)
+            write_text_background(output_dir / f"2_creator_raw_response_{i}.txt", raw_content)
+            write_text_background(output_dir / f"2_creator_output_{i}.html", html)
+            candidates.append({"index": i, "html": html, "structural_checks": checker.found})
+        
+        print(f"✓ {len(candidates)} candidates generated")
+        state.candidates = candidates
+        
+    except Exception as e:
+        print(f"✗ Creator failed: {e}")
+        write_text_background(output_dir / "2_creator_error.txt", str(e))
+        raise
+    
+    return state
+
+
+async def select_best_node(state: SimulationState, reviewer_chain) -> SimulationState:
+    """Select Best Node - Reviews every distinct candidate concurrently, keeps the best"""
+    print("\n[SELECT BEST NODE] Reviewing candidates...")
+    
+    output_dir = Path(state.output_dir)
+    candidates = state.candidates
+    state.iteration += 1  # one round, however many candidates it drew
+    
+    # identical draws (e.g. temperature 0) only need one review
+    seen, unique = set(), []
+    for candidate in candidates:
+        if candidate["html"] not in seen:
+            seen.add(candidate["html"])
+            unique.append(candidate)
+    raw_replies = await asyncio.gather(
+        *(review_reply(state, c["html"], c["structural_checks"], reviewer_chain) for c in unique),
+        return_exceptions=True
+    )
+    
+    best, best_rank = None, None
+    lines = []
+    for candidate, raw_content in zip(unique, raw_replies):
+        i = candidate["index"]
+        try:
+            if isinstance(raw_content, Exception):
+                raise raw_content
+            write_text_background(output_dir / f"3_reviewer_raw_response_{i}.txt", raw_content)
+            review_data = safe_json_parse(raw_content)
+            scores = review_data.get("scores", {})
+            avg_score = statistics.fmean(scores.values()) if scores else 0.0
+        except Exception as e:
+            lines.append(f"  ✗ Candidate {i}: review failed ({e})")
+            continue
+        passed = bool(review_data.get("pass", False))
+        lines.append(f"  {'✅' if passed else '❌'} Candidate {i}: {avg_score:.2f}/5.0")
+        if best_rank is None or (passed, avg_score) > best_rank:
+            best, best_rank = (candidate, review_data), (passed, avg_score)
+    print("\n".join(lines))
+    
+    if best is None:
+        print("✗ Reviewer failed for every candidate")
+        write_text_background(output_dir / "3_reviewer_error.txt", "every candidate review failed")
+        best = (candidates[0], {})
+    
+    candidate, review_data = best
+    write_text_background(output_dir / "2_creator_output.html", candidate["html"])
+    if review_data:
+        write_text_background(output_dir / "3_reviewer_results.json", json_dumps(review_data))
+    
+    state.creator_output = candidate["html"]
+    state.structural_checks = candidate["structural_checks"]
+    state.reviewer_output = review_data
+    state.approved = bool(review_data.get("pass", False))
+    return state
+
+
 # ---------- Conditional Edge ----------
 
 def should_continue(state: SimulationState) -> str:
     """Decide whether to end or continue"""
-    if state.get("approved", False):
+    if state.approved:
         return "end"
     
-    iteration = state.get("iteration", 0)
-    max_iterations = state.get("max_iterations", 1)
+    iteration = state.iteration
+    max_iterations = state.max_iterations
     
     if iteration >= max_iterations:
         print(f"\n⚠ Reached max iterations ({max_iterations}), stopping...")
         return "end"
-    
-    print(f"\n↻ Not approved, would iterate (iteration {iteration}/{max_iterations})...")
-    # For now, just end after one attempt
-    return "end"
+
+    if state.html_unchanged:
+        # the creator produced the same HTML again; another round would too
+        print("\n⚠ Creator output did not change, stopping...")
+        return "end"
+
+    print(f"\n↻ Not approved, regenerating (iteration {iteration}/{max_iterations})...")
+    return "continue"
 
 
 # ---------- Graph Builder ----------
 
-def build_graph(planner_chain, creator_chain, reviewer_chain) -> StateGraph:
-    """Build the LangGraph workflow"""
+def build_graph(planner_chain, creator_chain, reviewer_chain, draft=None, parallel: bool = False):
+    """
+    Build the LangGraph workflow (`draft`: optional speculative creator reply).
+    With `parallel`, Planner -> Parallel Creator -> Select Best replaces the
+    sequential revision loop.
+    """
     
+    from langgraph.graph import StateGraph, END
+
     workflow = StateGraph(SimulationState)
     
-    # Add nodes
-    workflow.add_node("planner", lambda state: planner_node(state, planner_chain))
-    workflow.add_node("creator", lambda state: creator_node(state, creator_chain))
-    workflow.add_node("reviewer", lambda state: reviewer_node(state, reviewer_chain))
+    # Add nodes (async closures so the graph runs them on the event loop)
+    async def planner(state: SimulationState) -> SimulationState:
+        return await planner_node(state, planner_chain)
+
+    if parallel:
+        async def parallel_creator(state: SimulationState) -> SimulationState:
+            return await parallel_creator_node(state, creator_chain, draft)
+
+        async def select_best(state: SimulationState) -> SimulationState:
+            return await select_best_node(state, reviewer_chain)
+
+        workflow.add_node("planner", planner)
+        workflow.add_node("parallel_creator", parallel_creator)
+        workflow.add_node("select_best", select_best)
+        workflow.set_entry_point("planner")
+        workflow.add_edge("planner", "parallel_creator")
+        workflow.add_edge("parallel_creator", "select_best")
+        workflow.add_edge("select_best", END)
+        return workflow.compile()
+
+    async def creator(state: SimulationState) -> SimulationState:
+        return await creator_node(state, creator_chain, draft)
+
+    async def reviewer(state: SimulationState) -> SimulationState:
+        return await reviewer_node(state, reviewer_chain)
+
+    workflow.add_node("planner", planner)
+    workflow.add_node("creator", creator)
+    workflow.add_node("reviewer", reviewer)
     
     # Add edges
     workflow.set_entry_point("planner")
@@ -342,17 +834,26 @@ def build_graph(planner_chain, creator_chain, reviewer_chain) -> StateGraph:
 
 # ---------- Main Generation Function ----------
 
-def generate_simulation(
+async def generate_simulation(
     spec_path: str,
     planner_chain,
     creator_chain,
     reviewer_chain,
     output_root: str = "output",
     max_iterations: int = 1,
-    prompts: Dict[str, str] = None
+    prompts: Dict[str, str] = None,
+    speculative: bool = False,
+    parallel: bool = False,
+    spec: Optional[Dict[str, Any]] = None,
+    spec_json: Optional[str] = None,
+    use_cache: bool = False
 ) -> tuple[bool, str, Path]:
     """
-    Generate simulation using LangGraph
+    Generate simulation using LangGraph. Callers that already read the spec pass
+    `spec` (and optionally its text as `spec_json`) so spec_path isn't re-read.
+    With `use_cache`, node replies for identical inputs come from NODE_CACHE_DIR.
+    With `parallel`, max_iterations candidates are generated and reviewed at
+    once and the best one is kept (only their reviews use the node cache).
     
     Returns: (approved: bool, html: str, output_dir: Path)
     """
@@ -364,8 +865,16 @@ def generate_simulation(
     # Load spec
     print("\n[SETUP] Loading specification...")
     try:
-        spec = load_spec(spec_path)
-        spec_json = json.dumps(spec, indent=2, ensure_ascii=False)
+        spec_bytes = None
+        if spec is None:
+            spec, spec_bytes = load_spec(spec_path)
+            if spec_json is None and _looks_pretty(spec_bytes):
+                # an indented spec file is used verbatim, not parsed and re-dumped
+                spec_json = spec_bytes.decode("utf-8")
+            else:
+                spec_bytes = None
+        if spec_json is None:
+            spec_json = json_dumps(spec)
         concept_name = spec.get('Concept', 'Unknown Concept')
         print(f"✓ Concept: {concept_name}")
     except Exception as e:
@@ -378,39 +887,45 @@ def generate_simulation(
     print(f"✓ Output directory: {output_dir}")
     
     # Save spec
-    (output_dir / "0_spec.json").write_text(spec_json, encoding="utf-8")
+    write_text_background(output_dir / "0_spec.json", spec_bytes if spec_bytes is not None else spec_json)
     
     # Build graph
     print("\n[SETUP] Building LangGraph workflow...")
-    graph = build_graph(planner_chain, creator_chain, reviewer_chain)
+    draft = None
+    if speculative:
+        # creator starts from a spec-only stub while the planner works; the
+        # creator node keeps this draft only if it covers the real plan
+        draft = asyncio.ensure_future(creator_chain.ainvoke({
+            "spec_json": spec_json,
+            "blueprint": json_dumps(stub_blueprint(spec)),
+            "development_plan": "",
+            "feedback": NO_FEEDBACK,
+        }))
+    graph = build_graph(planner_chain, creator_chain, reviewer_chain, draft, parallel)
     print("✓ Graph compiled")
     
     # FIX: Initialize state with correct types
-    initial_state: SimulationState = {
-        "spec_json": spec_json,
-        "concept_name": concept_name,
-        "planner_raw_output": "",  # Initialize as empty string
-        "planner_blueprint": {},   # Use correct key name
-        "creator_output": "",
-        "reviewer_output": {},
-        "output_dir": str(output_dir),
-        "iteration": 0,
-        "max_iterations": max_iterations,
-        "approved": False
-    }
+    initial_state = SimulationState(
+        spec_json=spec_json,
+        concept_name=concept_name,
+        output_dir=str(output_dir),
+        max_iterations=max_iterations,
+        use_cache=use_cache
+    )
     
     # Run graph
     print("\n[EXECUTION] Running workflow...")
     print("-" * 70)
     
     try:
-        final_state = graph.invoke(initial_state)
+        final_state = await graph.ainvoke(initial_state)
+        await flush_writes(output_dir)
         
         # Save final output
         html = final_state.get("creator_output", "")
         approved = final_state.get("approved", False)
         
-        (output_dir / "4_final_output.html").write_text(html, encoding="utf-8")
+        await write_final_async(output_dir / "4_final_output.html", html)
         
         # Save final summary
         summary = {
@@ -420,9 +935,9 @@ def generate_simulation(
             "timestamp": datetime.now().isoformat(),
             "output_dir": str(output_dir)
         }
-        (output_dir / "4_summary.json").write_text(
-            json.dumps(summary, indent=2), encoding="utf-8"
-        )
+        if parallel:
+            summary["candidates"] = len(final_state.get("candidates", []))
+        await write_final_async(output_dir / "4_summary.json", json_dumps(summary))
         
         print("\n" + "=" * 70)
         print("GENERATION COMPLETE")
@@ -434,6 +949,12 @@ def generate_simulation(
         return approved, html, output_dir
         
     except Exception as e:
+        if draft is not None:
+            draft.cancel()
+        try:
+            await flush_writes(output_dir)
+        except OSError:
+            pass  # the workflow error below is the one worth reporting
         print(f"\n✗ Workflow failed: {e}")
-        (output_dir / "error.txt").write_text(str(e), encoding="utf-8")
+        await write_text_async(output_dir / "error.txt", str(e))
         return False, "", output_dir
\ No newline at end of file